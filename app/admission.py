@@ -0,0 +1,186 @@
+"""
+Admission Control
+=================
+Keeps a burst of chat traffic from turning into unbounded concurrent Azure
+OpenAI calls (and the 429s that follow):
+
+- ConcurrencyLimiter: at most max_concurrent requests run at once, up to
+  max_queue more wait for a slot for at most queue_timeout seconds, the
+  rest are rejected right away
+- TokenBudgets: one token bucket of LLM tokens per tenant, charged with a
+  request's estimated tokens before any LLM call is made
+
+Rejections carry a Retry-After estimate in seconds.
+"""
+
+import asyncio
+import math
+import time
+from typing import Callable, Dict, Optional
+
+
+class AdmissionRejected(Exception):
+    """A request that should be answered with status_code and a Retry-After header"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Slot:
+    """A held concurrency slot; release() is idempotent"""
+
+    def __init__(self, limiter: Optional["ConcurrencyLimiter"]):
+        self._limiter = limiter
+        self._acquired_at = time.monotonic()
+
+    def release(self):
+        if self._limiter is not None:
+            limiter, self._limiter = self._limiter, None
+            limiter._release(time.monotonic() - self._acquired_at)
+
+    # A slot dropped without release (e.g. held by a stream the client abandoned
+    # before it started) is returned when it is garbage collected
+    __del__ = release
+
+
+class ConcurrencyLimiter:
+    """Bounded concurrency with a bounded, timed wait queue"""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float,
+                 on_queue_change: Optional[Callable[[int], None]] = None,
+                 on_admit: Optional[Callable[[float], None]] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.on_queue_change = on_queue_change
+        self.on_admit = on_admit
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Moving average of how long a request holds its slot, for Retry-After
+        self._hold_seconds = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the requests ahead of a new one should have drained"""
+        return max(1, math.ceil(self._hold_seconds * (self.waiting + 1) / self.max_concurrent))
+
+    async def acquire(self) -> Slot:
+        started = time.monotonic()
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending (wait_for would only take it
+            # on a later loop iteration), so a burst cannot all slip past the queue bound
+            await self._semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejected(503, "queue_full", self.retry_after())
+            self.waiting += 1
+            if self.on_queue_change:
+                self.on_queue_change(1)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise AdmissionRejected(503, "queue_timeout", self.retry_after())
+            finally:
+                self.waiting -= 1
+                if self.on_queue_change:
+                    self.on_queue_change(-1)
+        self.active += 1
+        self.admitted += 1
+        if self.on_admit:
+            self.on_admit(time.monotonic() - started)
+        return Slot(self)
+
+    def _release(self, held_seconds: float):
+        self.active -= 1
+        self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * held_seconds
+        self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class TokenBucket:
+    """capacity tokens, refilled continuously at rate tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float) -> float:
+        """Take amount tokens; returns 0 on success, else the seconds until they are available"""
+        self._refill(time.monotonic())
+        # A request larger than the bucket still passes once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def give(self, amount: float):
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class TokenBudgets:
+    """Per-tenant LLM token buckets"""
+
+    def __init__(self, tokens_per_minute: float, burst: float, max_tenants: int = 10000):
+        self.rate = tokens_per_minute / 60
+        self.burst = burst
+        self.max_tenants = max_tenants
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.rejected = 0
+
+    def _bucket(self, tenant_id: str) -> TokenBucket:
+        bucket = self._buckets.get(tenant_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_tenants:
+                self._prune()
+            bucket = self._buckets[tenant_id] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _prune(self):
+        """Forget buckets that have refilled completely; a new bucket starts full anyway"""
+        now = time.monotonic()
+        for tenant_id, bucket in list(self._buckets.items()):
+            bucket._refill(now)
+            if bucket.tokens >= bucket.capacity:
+                del self._buckets[tenant_id]
+
+    def charge(self, tenant_id: str, tokens: int):
+        """Charge a request's estimated tokens, or raise AdmissionRejected (429)"""
+        wait = self._bucket(tenant_id).take(tokens)
+        if wait:
+            self.rejected += 1
+            raise AdmissionRejected(429, "token_budget", max(1, math.ceil(wait)))
+
+    def refund(self, tenant_id: str, tokens: int):
+        self._bucket(tenant_id).give(tokens)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "tokens_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "tenants": len(self._buckets),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,74 @@
+"""
+Build Intent Centroids
+======================
+Offline script that embeds labeled example queries and writes one centroid
+per intent label, for INTENT_BACKEND=local in main.py.
+
+Usage (from the app/ directory):
+    python build_intent_centroids.py
+    python build_intent_centroids.py --examples data/intent_examples.jsonl --output data/intent_centroids.json
+
+The examples file is JSON lines: {"text": "...", "label": "technical"}
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from clients import ClientRegistry
+from embedding_cache import CachedEmbeddings
+from intent_classifier import INTENT_LABELS, CentroidIntentClassifier, build_centroids
+
+APP_DIR = Path(__file__).parent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build intent centroids from labeled example queries")
+    parser.add_argument("--examples", default=str(APP_DIR / "data" / "intent_examples.jsonl"))
+    parser.add_argument("--output", default=str(APP_DIR / "data" / "intent_centroids.json"))
+    args = parser.parse_args()
+
+    env_path = APP_DIR.parent / ".env"
+    load_dotenv(env_path if env_path.exists() else None)
+    deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
+
+    with open(args.examples, encoding="utf-8") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+    unknown = {example["label"] for example in examples} - set(INTENT_LABELS)
+    if unknown:
+        raise SystemExit(f"❌ Unknown labels in {args.examples}: {sorted(unknown)}")
+
+    clients = ClientRegistry(
+        endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
+    )
+    embeddings = CachedEmbeddings(
+        clients.embeddings(deployment),
+        namespace=deployment,
+        path=os.getenv("EMBEDDING_CACHE_PATH", str(APP_DIR / ".cache" / "embeddings.sqlite"))
+    )
+
+    texts = [example["text"] for example in examples]
+    labels = [example["label"] for example in examples]
+    vectors = embeddings.embed_documents(texts)
+    centroids = build_centroids(vectors, labels)
+
+    # Training-set accuracy is an optimistic sanity check, not an evaluation
+    model = CentroidIntentClassifier(centroids)
+    correct = sum(1 for vector, label in zip(vectors, labels) if model.classify(vector)[0] == label)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"embedding_deployment": deployment, "centroids": centroids}, f)
+
+    print(f"✅ Wrote {len(centroids)} centroids from {len(examples)} examples to {args.output}")
+    print(f"   Embedding deployment: {deployment}")
+    print(f"   Training accuracy: {correct}/{len(examples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Azure OpenAI Client Registry
+============================
+Builds the chat and embedding clients once and shares them across
+initialize_rag, /chat and /documents.
+
+All clients ride on one tuned httpx connection pool (one sync, one async),
+so requests reuse warm keep-alive connections (HTTP/2 when the optional
+`h2` package is installed) instead of paying a TLS handshake per request.
+"""
+
+import threading
+from typing import Dict, Optional
+
+import httpx
+from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
+
+try:
+    import h2  # noqa: F401 - only needed so httpx can negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ClientRegistry:
+    """Process-wide cache of Azure OpenAI clients sharing one connection pool"""
+
+    def __init__(self, endpoint: Optional[str], api_key: Optional[str], api_version: str,
+                 max_connections: int = 100, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0, http2: bool = True, timeout: float = 60.0,
+                 tokenize_embeddings: bool = True, max_retries: int = 2):
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.api_version = api_version
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.timeout = httpx.Timeout(timeout, connect=10.0)
+        self.tokenize_embeddings = tokenize_embeddings
+        # SDK-level retries; 0 when the resilience layer owns retries
+        self.max_retries = max_retries
+        self.requests_total = 0
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._http_async_client: Optional[httpx.AsyncClient] = None
+        self._chat: Dict[tuple, AzureChatOpenAI] = {}
+        self._embeddings: Dict[str, AzureOpenAIEmbeddings] = {}
+
+    def _count_request(self, request):
+        self.requests_total += 1
+
+    async def _acount_request(self, request):
+        self.requests_total += 1
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(
+                    limits=self.limits, http2=self.http2, timeout=self.timeout,
+                    event_hooks={"request": [self._count_request]}
+                )
+            return self._http_client
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._http_async_client is None:
+                self._http_async_client = httpx.AsyncClient(
+                    limits=self.limits, http2=self.http2, timeout=self.timeout,
+                    event_hooks={"request": [self._acount_request]}
+                )
+            return self._http_async_client
+
+    def chat(self, deployment: str, temperature: float = 0.7) -> AzureChatOpenAI:
+        """Shared chat client for a deployment"""
+        key = (deployment, temperature)
+        http_client, http_async_client = self.http_client, self.http_async_client
+        with self._lock:
+            if key not in self._chat:
+                self._chat[key] = AzureChatOpenAI(
+                    azure_endpoint=self.endpoint,
+                    api_key=self.api_key,
+                    azure_deployment=deployment,
+                    api_version=self.api_version,
+                    temperature=temperature,
+                    max_retries=self.max_retries,
+                    http_client=http_client,
+                    http_async_client=http_async_client
+                )
+            return self._chat[key]
+
+    def embeddings(self, deployment: str) -> AzureOpenAIEmbeddings:
+        """Shared embedding client for a deployment"""
+        http_client, http_async_client = self.http_client, self.http_async_client
+        with self._lock:
+            if deployment not in self._embeddings:
+                self._embeddings[deployment] = AzureOpenAIEmbeddings(
+                    azure_endpoint=self.endpoint,
+                    api_key=self.api_key,
+                    azure_deployment=deployment,
+                    api_version=self.api_version,
+                    check_embedding_ctx_length=self.tokenize_embeddings,
+                    max_retries=self.max_retries,
+                    http_client=http_client,
+                    http_async_client=http_async_client
+                )
+            return self._embeddings[deployment]
+
+    @staticmethod
+    def _pool_stats(client) -> dict:
+        # httpx does not expose its pool publicly; read the httpcore pool when present
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        return {
+            "connections": len(connections),
+            "idle": sum(1 for conn in connections if conn.is_idle()),
+            "http2": sum(1 for conn in connections if "HTTP/2" in repr(conn)),
+        }
+
+    def stats(self) -> dict:
+        """Pool configuration and live connection counts"""
+        return {
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "http2_enabled": self.http2,
+            "requests_total": self.requests_total,
+            "sync_pool": self._pool_stats(self._http_client) if self._http_client else None,
+            "async_pool": self._pool_stats(self._http_async_client) if self._http_async_client else None,
+            "chat_clients": len(self._chat),
+            "embedding_clients": len(self._embeddings),
+        }
+
+    async def aclose(self):
+        """Close both connection pools (application shutdown)"""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
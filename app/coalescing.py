@@ -0,0 +1,133 @@
+"""
+Request Coalescing (Single-Flight)
+==================================
+Concurrent identical chat requests share one in-flight pipeline execution.
+
+The first caller for a key becomes the leader and starts the work in its own
+task; callers that arrive while it is running become followers and receive
+the same result. Because the work runs in a separate task, a leader whose
+client disconnects does not cancel the answer the followers are waiting for.
+
+For streaming responses every event is recorded, so followers that join late
+replay the events already sent and then continue live.
+"""
+
+import asyncio
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+def coalescing_key(message: str, *parts: Any) -> tuple:
+    """Normalize whitespace and case so trivially different messages coalesce"""
+    return (re.sub(r"\s+", " ", message).strip().lower(),) + parts
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.followers = 0
+        self.broadcast: Optional["_Broadcast"] = None
+
+
+class _Broadcast:
+    """Append-only event log that any number of subscribers can replay and follow"""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, event: Any):
+        self.events.append(event)
+        self._notify()
+
+    def close(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key"""
+
+    def __init__(self):
+        self._flights: Dict[tuple, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, key: tuple, start: Callable[[], Awaitable]) -> Tuple[_Flight, bool]:
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.followers += 1
+            self.followers += 1
+            return flight, False
+
+        flight = _Flight(asyncio.ensure_future(start()))
+        self._flights[key] = flight
+        self.leaders += 1
+
+        def _finished(task: asyncio.Task):
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if not task.cancelled():
+                task.exception()  # Mark as retrieved; callers re-raise it themselves
+
+        flight.task.add_done_callback(_finished)
+        return flight, True
+
+    async def do(self, key: tuple, fn: Callable[[], Awaitable]) -> Tuple[Any, bool, int]:
+        """
+        Run fn() once for all concurrent callers with the same key.
+        Returns (result, is_leader, number of followers that shared the result).
+        """
+        flight, is_leader = self._join(key, fn)
+        result = await asyncio.shield(flight.task)
+        return result, is_leader, flight.followers
+
+    def stream(self, key: tuple, fn: Callable[[], AsyncIterator]) -> Tuple[AsyncIterator, bool, _Flight]:
+        """
+        Run the async generator fn() once for all concurrent callers with the same key.
+        Returns (event iterator for this caller, is_leader, flight); flight.followers
+        is final once the iterator is exhausted.
+        """
+        broadcast = _Broadcast()
+
+        async def pump():
+            try:
+                async for event in fn():
+                    broadcast.publish(event)
+                broadcast.close()
+            except Exception as e:
+                broadcast.close(e)
+            finally:
+                if not broadcast.done:
+                    broadcast.close(asyncio.CancelledError())
+
+        flight, is_leader = self._join(key, pump)
+        if is_leader:
+            flight.broadcast = broadcast
+        return flight.broadcast.subscribe(), is_leader, flight
+
+    def stats(self) -> dict:
+        return {
+            "inflight": len(self._flights),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
@@ -0,0 +1,152 @@
+"""
+Token-Budgeted Context Assembly
+===============================
+Builds the RAG context from retrieved chunks under a token budget:
+
+1. Near-duplicate chunks are dropped (Jaccard similarity of word shingles)
+2. Text a chunk repeats from the end of an earlier chunk (the splitter's
+   chunk_overlap) is trimmed from its start
+3. Chunks are added in retrieval order until the budget is used up; the
+   last one is truncated if a useful part of it still fits
+
+Tokens are counted with tiktoken. When its encoding files cannot be loaded
+(offline hosts), a four-characters-per-token estimate is used instead.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n"
+_WORD = re.compile(r"\w+")
+
+
+class TokenCounter:
+    """tiktoken encoding, or a character-based estimate when it is unavailable"""
+
+    def __init__(self, encoding_name: str = "o200k_base"):
+        self.encoding_name = encoding_name
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            logger.warning("tiktoken encoding unavailable, estimating tokens", extra={
+                "encoding": encoding_name,
+                "error": str(e)
+            })
+            self._encoding = None
+
+    @property
+    def exact(self) -> bool:
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return self._encoding.decode(tokens[:max_tokens])
+        return text[:max_tokens * 4]
+
+
+@dataclass
+class ContextStats:
+    tokens: int
+    chunks_used: int
+    chunks_duplicate: int
+    chunks_over_budget: int
+    overlap_chars_trimmed: int
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _overlap(previous: str, text: str, max_chars: int, min_chars: int) -> int:
+    """Length of the longest prefix of text that previous ends with"""
+    if len(text) < min_chars:
+        return 0
+    tail = previous[-min(max_chars, len(text)):]
+    # Only positions where text's first min_chars characters occur can start an overlap
+    start = tail.find(text[:min_chars])
+    while start != -1:
+        if text.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(text[:min_chars], start + 1)
+    return 0
+
+
+class ContextBuilder:
+    """Assembles retrieved chunks into a prompt context within a token budget"""
+
+    def __init__(self, token_budget: int = 1500, dedup_threshold: float = 0.8,
+                 max_overlap_chars: int = 200, min_truncated_tokens: int = 50,
+                 counter: Optional[TokenCounter] = None):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self.max_overlap_chars = max_overlap_chars
+        self.min_truncated_tokens = min_truncated_tokens
+        self.counter = counter or TokenCounter()
+
+    def build(self, docs: Sequence[Document]) -> tuple:
+        """Returns (context text, ContextStats)"""
+        kept: List[str] = []
+        kept_shingles: List[set] = []
+        duplicates = over_budget = trimmed = 0
+        used = 0
+        separator_tokens = self.counter.count(SEPARATOR)
+
+        for doc in docs:
+            text = doc.page_content.strip()
+            if not text:
+                continue
+            shingles = _shingles(text)
+            if any(_jaccard(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                duplicates += 1
+                continue
+            for previous in kept:
+                overlap = _overlap(previous, text, self.max_overlap_chars, min_chars=20)
+                if overlap:
+                    text = text[overlap:].lstrip()
+                    trimmed += overlap
+                    break
+            if not text:
+                duplicates += 1
+                continue
+
+            cost = self.counter.count(text) + (separator_tokens if kept else 0)
+            remaining = self.token_budget - used
+            if cost > remaining:
+                over_budget += 1
+                available = remaining - (separator_tokens if kept else 0)
+                if available < self.min_truncated_tokens:
+                    continue
+                text = self.counter.truncate(text, available)
+                cost = self.counter.count(text) + (separator_tokens if kept else 0)
+            kept.append(text)
+            kept_shingles.append(shingles)
+            used += cost
+
+        context = SEPARATOR.join(kept)
+        return context, ContextStats(
+            tokens=self.counter.count(context),
+            chunks_used=len(kept),
+            chunks_duplicate=duplicates,
+            chunks_over_budget=over_budget,
+            overlap_chars_trimmed=trimmed,
+        )
@@ -0,0 +1,90 @@
+"""
+Query Embedding Micro-Batcher
+=============================
+Gathers query embeddings from concurrent requests and sends them to the
+embedding deployment as one batched call.
+
+A batch is flushed when it reaches max_batch_size texts or when its oldest
+text has waited max_wait_ms, whichever comes first. Under load this trades
+a few milliseconds of latency for far fewer embedding requests, which is
+what the deployment's requests-per-minute limit counts.
+"""
+
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+
+class EmbeddingBatcher:
+    """Coalesces concurrent embed_query() calls into batched embedding calls"""
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 on_batch: Optional[Callable[[int, List[float]], None]] = None):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Called with (batch size, queue wait in seconds of every text) before each call
+        self.on_batch = on_batch
+        self.batches = 0
+        self.texts = 0
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._inflight = set()
+        # CachedEmbeddings keeps query vectors out of its persistent document cache
+        self._embed_batch = getattr(embeddings, "aembed_queries", embeddings.aembed_documents)
+
+    async def embed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        flush_task = asyncio.ensure_future(self._run(batch))
+        self._inflight.add(flush_task)
+        flush_task.add_done_callback(self._inflight.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        now = time.perf_counter()
+        # Identical queries in one window are embedded once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        self.batches += 1
+        self.texts += len(batch)
+        if self.on_batch is not None:
+            self.on_batch(len(texts), [now - enqueued for _, _, enqueued in batch])
+        try:
+            vectors = dict(zip(texts, await self._embed_batch(texts)))
+        except BaseException as e:
+            # Also when the flush task itself is cancelled (e.g. at shutdown):
+            # callers must not wait forever on a batch that will never finish
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if isinstance(e, Exception):
+                return
+            raise
+        for text, future, _ in batch:
+            # Callers that gave up (cancelled) have already resolved their future
+            if not future.done():
+                future.set_result(vectors[text])
+
+    def stats(self) -> dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
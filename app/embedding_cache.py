@@ -0,0 +1,171 @@
+"""
+Persistent Embedding Cache
+==========================
+Wraps any LangChain Embeddings object with a content-addressed SQLite cache.
+
+Vectors are keyed by sha256(deployment name + text), so unchanged chunks cost
+zero embedding calls across restarts and redeploys, while switching the
+embedding deployment never returns vectors from a different model.
+
+Only document (chunk) embeddings are persisted. Query embeddings are one-off
+user input, so they are kept in an in-memory LRU of max_queries vectors
+instead of growing the cache file with every question ever asked.
+"""
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from an on-disk cache"""
+
+    def __init__(self, underlying: Embeddings, namespace: str, path: str = ":memory:", max_queries: int = 1024):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.path = path
+        self.max_queries = max_queries
+        self.hits = 0
+        self.misses = 0
+        self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Embedding calls may come from executor threads (async retrieval)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            if path != ":memory:":
+                # WAL lets several worker processes share one cache file
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+
+    def key(self, text: str) -> str:
+        """Content address of a text for this embedding deployment"""
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _save(self, items: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def _lookup(self, texts: List[str]):
+        """Return (keys, cached vectors by key, unique texts that still need embedding)"""
+        keys = [self.key(text) for text in texts]
+        cached = self._load(list(dict.fromkeys(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, vectors) -> List[List[float]]:
+        fresh = dict(zip(missing.keys(), vectors))
+        if fresh:
+            self._save(fresh)
+        cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, cached, missing = self._lookup(texts)
+        vectors = self.underlying.embed_documents(list(missing.values())) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # SQLite reads and commits block, so they run off the event loop
+        keys, cached, missing = await asyncio.to_thread(self._lookup, texts)
+        vectors = await self.underlying.aembed_documents(list(missing.values())) if missing else []
+        fresh = dict(zip(missing.keys(), vectors))
+        if fresh:
+            await asyncio.to_thread(self._save, fresh)
+        cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def _lookup_queries(self, texts: List[str]):
+        """Like _lookup, against the in-memory query LRU"""
+        keys = [self.key(text) for text in texts]
+        cached, missing = {}, {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in self._queries:
+                    self._queries.move_to_end(key)
+                    cached[key] = self._queries[key]
+                else:
+                    missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+        return keys, cached, missing
+
+    def _merge_queries(self, keys, cached, missing, vectors) -> List[List[float]]:
+        fresh = dict(zip(missing.keys(), vectors))
+        with self._lock:
+            for key, vector in fresh.items():
+                self._queries[key] = vector
+                self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, cached, missing = self._lookup_queries([text])
+        vectors = [self.underlying.embed_query(text)] if missing else []
+        return self._merge_queries(keys, cached, missing, vectors)[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_queries([text]))[0]
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Batched query embeddings (see EmbeddingBatcher), cached in memory only"""
+        keys, cached, missing = self._lookup_queries(texts)
+        vectors = []
+        if len(missing) == 1:
+            vectors = [await self.underlying.aembed_query(next(iter(missing.values())))]
+        elif missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+        return self._merge_queries(keys, cached, missing, vectors)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Hit/miss counters since process start"""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "query_entries": len(self._queries),
+            "max_queries": self.max_queries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,127 @@
+"""
+Bulk Document Ingestion
+=======================
+Helpers for /documents/batch:
+
+- iter_json_objects() incrementally parses a streamed NDJSON or JSON-array
+  request body, so large uploads never have to be held in memory at once
+- split_documents() turns documents into chunks; it is a plain module-level
+  function so it can run in a worker process pool
+"""
+
+import codecs
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+_JSON_WHITESPACE = " \t\r\n"
+_JSON_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+_JSON_NUMBER_CHARS = set("0123456789+-.eE")
+_JSON_ESCAPE_CHARS = set("\\u0123456789abcdefABCDEF")
+
+# Longest single document held while waiting for the rest of it
+MAX_DOCUMENT_CHARS = 8 * 1024 * 1024
+
+
+def make_text_splitter() -> RecursiveCharacterTextSplitter:
+    """The splitter used for every knowledge base document"""
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+# One splitter per worker process, created on first use
+_splitter = None
+
+
+def split_documents(items: List[Tuple[str, Optional[dict]]]) -> List[Tuple[str, dict]]:
+    """Split (content, metadata) pairs into (chunk text, metadata) pairs"""
+    global _splitter
+    if _splitter is None:
+        _splitter = make_text_splitter()
+    docs = _splitter.create_documents(
+        [content for content, _ in items],
+        metadatas=[metadata or {} for _, metadata in items]
+    )
+    return [(doc.page_content, doc.metadata) for doc in docs]
+
+
+def _is_truncated(buffer: str, error: json.JSONDecodeError) -> bool:
+    """Whether more data could still complete the object that failed to decode"""
+    if error.pos >= len(buffer) or error.msg.startswith("Unterminated string"):
+        return True
+    rest = buffer[error.pos:]
+    # A \uXXXX escape (or surrogate pair) cut off at the end of the buffer
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        return len(rest) < 12 and set(rest) <= _JSON_ESCAPE_CHARS
+    # A literal or number cut off at the end of the buffer (e.g. "tru" or "2.5e")
+    return any(literal.startswith(rest) for literal in _JSON_LITERALS) or set(rest) <= _JSON_NUMBER_CHARS
+
+
+async def iter_json_objects(body: AsyncIterator[bytes], max_document_chars: int = MAX_DOCUMENT_CHARS) -> AsyncIterator[dict]:
+    """
+    Yield objects from a streamed body that is either a JSON array of objects
+    or NDJSON (one object per line). Raises ValueError on malformed input as
+    soon as it is seen, and on a document longer than max_document_chars.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    in_array = None  # Unknown until the first non-whitespace character
+    array_closed = False
+
+    async for raw in body:
+        text = text_decoder.decode(raw)
+        # An object can only be completed by a chunk holding its closing brace,
+        # so a large document arriving in many chunks is not re-parsed for each
+        retry = "}" in text or not buffer.strip()
+        buffer += text
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in _JSON_WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if array_closed:
+                raise ValueError("Unexpected data after the end of the JSON array")
+            char = buffer[pos]
+            if in_array is None:
+                in_array = char == "["
+                if in_array:
+                    pos += 1
+                    continue
+            if in_array and char == ",":
+                pos += 1
+                continue
+            if in_array and char == "]":
+                array_closed = True
+                pos += 1
+                continue
+            if not retry:
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if not _is_truncated(buffer, e):
+                    raise ValueError(f"Malformed document: {e}")
+                break  # Incomplete object, wait for more data
+            if not isinstance(item, dict):
+                raise ValueError("Every document must be a JSON object")
+            pos = end
+            yield item
+        buffer = buffer[pos:]
+        if len(buffer) > max_document_chars:
+            raise ValueError(f"Document longer than {max_document_chars} characters")
+
+    buffer = (buffer + text_decoder.decode(b"", final=True)).strip(_JSON_WHITESPACE)
+    if buffer:
+        try:
+            decoder.raw_decode(buffer)
+        except json.JSONDecodeError as e:
+            if not _is_truncated(buffer, e):
+                raise ValueError(f"Malformed document: {e}")
+        raise ValueError("Request body ended with an incomplete document")
+    if in_array and not array_closed:
+        raise ValueError("JSON array is not closed")
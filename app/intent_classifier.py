@@ -0,0 +1,133 @@
+"""
+Local Intent Classification
+===========================
+Classifies a query into one of the intent labels without an LLM call.
+
+Two models are available:
+- Nearest centroid over query embeddings (the embedding is already computed
+  for retrieval, so classification is a handful of dot products). Centroids
+  are built offline with build_intent_centroids.py.
+- A keyword / n-gram model, used when no centroids are available.
+
+Both return a confidence in [0, 1]; callers fall back to the LLM classifier
+when it is below their threshold.
+"""
+
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+INTENT_LABELS = ("technical", "conceptual", "troubleshooting", "general")
+
+# Phrases that indicate an intent; multi-word phrases are matched as a whole
+INTENT_KEYWORDS = {
+    "technical": [
+        "how do i", "how to", "code", "python", "install", "configure", "configuration",
+        "setup", "set up", "api", "sdk", "instrument", "instrumentation", "endpoint",
+        "example", "snippet", "decorator", "token", "otlp", "deploy", "integrate", "query",
+    ],
+    "conceptual": [
+        "what is", "what are", "explain", "difference", "differences", "overview",
+        "concept", "compare", "versus", "vs", "meaning", "benefits", "why use",
+        "how does", "architecture", "purpose",
+    ],
+    "troubleshooting": [
+        "error", "errors", "not working", "doesn't work", "does not work", "fail",
+        "failed", "failing", "broken", "issue", "problem", "slow", "missing", "debug",
+        "exception", "can't", "cannot", "timeout", "crash", "no traces", "not showing", "429",
+    ],
+    "general": [
+        "hello", "hi", "hey", "thanks", "thank you", "who are you", "help",
+        "what can you do", "good morning",
+    ],
+}
+
+
+class KeywordIntentClassifier:
+    """Keyword / n-gram intent model"""
+
+    def __init__(self, keywords: Dict[str, List[str]] = None):
+        keywords = keywords or INTENT_KEYWORDS
+        self._patterns = {
+            label: re.compile(r"\b(?:" + "|".join(re.escape(p) for p in phrases) + r")\b")
+            for label, phrases in keywords.items()
+        }
+
+    def classify(self, query: str) -> Tuple[str, float]:
+        """
+        Returns (label, confidence). Confidence is top score / (total matches + 0.5):
+        one unambiguous keyword gives 0.67, a tie between two labels 0.4.
+        """
+        text = query.lower()
+        scores = {label: len(pattern.findall(text)) for label, pattern in self._patterns.items()}
+        label = max(scores, key=scores.get)
+        total = sum(scores.values())
+        if total == 0:
+            return "general", 0.0
+        return label, scores[label] / (total + 0.5)
+
+
+class CentroidIntentClassifier:
+    """Nearest-centroid intent model over query embeddings"""
+
+    def __init__(self, centroids: Dict[str, Sequence[float]], temperature: float = 0.05):
+        self.labels = list(centroids)
+        matrix = np.asarray([centroids[label] for label in self.labels], dtype=np.float32)
+        self._matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        self.temperature = temperature
+
+    def classify(self, embedding: Sequence[float]) -> Tuple[str, float]:
+        """Returns (label, confidence) with confidence = softmax of cosine similarities"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        similarities = self._matrix @ (vector / np.linalg.norm(vector))
+        logits = (similarities - similarities.max()) / self.temperature
+        weights = np.exp(logits)
+        best = int(np.argmax(similarities))
+        return self.labels[best], float(weights[best] / weights.sum())
+
+
+def build_centroids(vectors: List[Sequence[float]], labels: List[str]) -> Dict[str, List[float]]:
+    """Mean of the unit-normalized example embeddings for every label"""
+    grouped: Dict[str, List[np.ndarray]] = {}
+    for vector, label in zip(vectors, labels):
+        array = np.asarray(vector, dtype=np.float32)
+        grouped.setdefault(label, []).append(array / np.linalg.norm(array))
+    return {label: np.mean(group, axis=0).tolist() for label, group in grouped.items()}
+
+
+def load_centroids(path: str, embedding_deployment: str) -> Optional[Dict[str, List[float]]]:
+    """
+    Load centroids written by build_intent_centroids.py.
+    Returns None when the file is missing or was built with another embedding deployment.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("embedding_deployment") != embedding_deployment:
+        return None
+    return data["centroids"]
+
+
+class LocalIntentClassifier:
+    """Centroid model when centroids are available, keyword model otherwise"""
+
+    def __init__(self, centroids: Optional[Dict[str, List[float]]] = None, temperature: float = 0.05):
+        self.centroid_model = CentroidIntentClassifier(centroids, temperature) if centroids else None
+        self.keyword_model = KeywordIntentClassifier()
+
+    @property
+    def needs_embedding(self) -> bool:
+        return self.centroid_model is not None
+
+    def classify(self, query: str, embedding: Optional[Sequence[float]] = None) -> Tuple[str, float, str]:
+        """Returns (label, confidence, model name)"""
+        if self.centroid_model is not None and embedding is not None:
+            label, confidence = self.centroid_model.classify(embedding)
+            return label, confidence, "centroid"
+        label, confidence = self.keyword_model.classify(query)
+        return label, confidence, "keyword"
+
@@ -0,0 +1,142 @@
+"""
+Lexical Retrieval (BM25)
+========================
+In-process inverted index over the knowledge base chunks, kept in sync with
+the Chroma collection, plus reciprocal rank fusion of lexical and vector
+results.
+
+Exact-term queries ("OneAgent", "Grail", "DQL") are often served better
+lexically than by embeddings, and a lexical lookup needs no embedding call.
+"""
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+_TOKEN = re.compile(r"\w+")
+
+# Very common words carry no ranking signal and only widen the scan
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or that the this "
+    "to what when where which who why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over chunks keyed by their vector store id"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._documents: Dict[str, Document] = {}
+        self._total_length = 0
+        # Chunks are added from ingestion threads while the event loop searches
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, ids: Sequence[str], documents: Sequence[Document]):
+        """Index documents under their ids; re-adding an id replaces it"""
+        with self._lock:
+            for doc_id, document in zip(ids, documents):
+                if doc_id in self._documents:
+                    self._remove(doc_id)
+                counts = Counter(tokenize(document.page_content))
+                for term, count in counts.items():
+                    self._postings.setdefault(term, {})[doc_id] = count
+                length = sum(counts.values())
+                self._lengths[doc_id] = length
+                self._total_length += length
+                self._documents[doc_id] = document
+
+    def remove(self, ids: Sequence[str]):
+        """Drop documents from the index; unknown ids are ignored"""
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self._documents:
+                    self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        for term in set(tokenize(self._documents.pop(doc_id).page_content)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(doc_id)
+
+    def rebuild(self, ids: Sequence[str], texts: Sequence[str], metadatas: Optional[Sequence[dict]] = None):
+        """Replace the index contents, e.g. with everything the vector store holds"""
+        documents = [
+            Document(page_content=text, metadata=(metadatas[i] if metadatas else None) or {})
+            for i, text in enumerate(texts)
+        ]
+        with self._lock:
+            self._postings.clear()
+            self._lengths.clear()
+            self._documents.clear()
+            self._total_length = 0
+        self.add(ids, documents)
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Top k (id, score) pairs, best first; only documents sharing a query term score"""
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self._documents)
+            if not terms or not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def document(self, doc_id: str) -> Document:
+        return self._documents[doc_id]
+
+    def coverage(self, doc_id: str, query: str) -> float:
+        """Fraction of the query's terms that occur in the document"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        with self._lock:
+            return sum(1 for term in terms if doc_id in self._postings.get(term, ())) / len(terms)
+
+
+def is_decisive(index: BM25Index, query: str, hits: List[Tuple[str, float]],
+                min_coverage: float, min_margin: float) -> bool:
+    """
+    True when the best lexical hit contains enough of the query's terms
+    (min_coverage) and is clearly ahead of the runner-up (min_margin times its
+    score). Raw BM25 scores depend on corpus size, so neither test uses one.
+    """
+    if not hits or index.coverage(hits[0][0], query) < min_coverage:
+        return False
+    return len(hits) == 1 or hits[0][1] >= min_margin * hits[1][1]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Fuse ranked id lists: score(id) = sum of 1 / (k + rank) over the lists"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
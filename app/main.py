@@ -99,26 +99,53 @@ logger = logging.getLogger(__name__)
 
 # ════════════════════════════════════════════════════════════════════════════
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import functools
+import json
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from contextlib import asynccontextmanager
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager, contextmanager
 from pydantic import BaseModel
 from typing import Optional, List
-import chromadb
-from chromadb.config import Settings
-from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chromadb.errors import ChromaError
 from langchain_community.vectorstores import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
+from langchain_core.documents import Document
+from opentelemetry import trace
+from semantic_cache import SemanticCache
+from embedding_cache import CachedEmbeddings
+from vector_index import (
+    IngestManifest, sync_corpus, add_chunks, chunk_id, open_chroma_client,
+    process_lock, refresh_from_store, search_many_with_similarity, select_adaptive_k
+)
+from ingest import make_text_splitter, split_documents, iter_json_objects
+from clients import ClientRegistry
+import service_metrics
+from intent_classifier import LocalIntentClassifier, load_centroids
+from coalescing import SingleFlight, coalescing_key
+from embedding_batcher import EmbeddingBatcher
+from lexical_index import BM25Index, is_decisive, reciprocal_rank_fusion
+from context_builder import ContextBuilder, TokenCounter
+from admission import AdmissionRejected, ConcurrencyLimiter, Slot, TokenBudgets
+from resilience import CircuitOpenError, DeadlineExceeded, ResilientCaller, ResilientEmbeddings
+from model_router import ModelRouter, RoutingDecision, parse_routes
+from sessions import SESSION_ID_PATTERN, Session, SessionStore, new_session_id
+from tenants import Tenant, TenantRegistry, TenantPathMiddleware, TENANT_ID_PATTERN, collection_name
 
 # Get configuration from environment
 ATTENDEE_ID = os.getenv("ATTENDEE_ID", "workshop-attendee")
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("APP_PORT", 8000))
+# Uvicorn worker processes (more than one disables auto-reload); see CHROMA_SERVER_URL
+APP_WORKERS = int(os.getenv("APP_WORKERS", 1))
 
 # Azure OpenAI Configuration
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -127,6 +154,210 @@ AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4o
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
 
+# Shared HTTP connection pool used by every Azure OpenAI client
+AZURE_OPENAI_POOL_MAX_CONNECTIONS = int(os.getenv("AZURE_OPENAI_POOL_MAX_CONNECTIONS", 100))
+AZURE_OPENAI_POOL_MAX_KEEPALIVE = int(os.getenv("AZURE_OPENAI_POOL_MAX_KEEPALIVE", 20))
+AZURE_OPENAI_POOL_KEEPALIVE_EXPIRY = float(os.getenv("AZURE_OPENAI_POOL_KEEPALIVE_EXPIRY", 30))
+AZURE_OPENAI_HTTP2 = os.getenv("AZURE_OPENAI_HTTP2", "true").lower() == "true"
+AZURE_OPENAI_TIMEOUT_SECONDS = float(os.getenv("AZURE_OPENAI_TIMEOUT_SECONDS", 60))
+# Tokenize embedding inputs locally (tiktoken) to enforce the context length;
+# set to false on offline hosts, where tiktoken cannot download its encodings
+AZURE_OPENAI_EMBEDDING_TOKENIZE = os.getenv("AZURE_OPENAI_EMBEDDING_TOKENIZE", "true").lower() == "true"
+
+# How the intent classification LLM call is scheduled inside the RAG pipeline:
+#   sequential - intent, then retrieval, then generation (one stage at a time)
+#   concurrent - intent runs alongside the embedding + vector search (default)
+#   background - intent is fire-and-forget and never delays the answer
+INTENT_SCHEDULING_MODES = ("sequential", "concurrent", "background")
+INTENT_SCHEDULING = os.getenv("INTENT_SCHEDULING", "concurrent").strip().lower()
+if INTENT_SCHEDULING not in INTENT_SCHEDULING_MODES:
+    logger.warning("Unknown INTENT_SCHEDULING value, using 'concurrent'", extra={
+        "intent_scheduling": INTENT_SCHEDULING
+    })
+    INTENT_SCHEDULING = "concurrent"
+
+# Intent classification backend:
+#   llm   - one chat completion per query (default)
+#   local - nearest-centroid model over the query embedding (keyword model when no
+#           centroids were built), LLM only below INTENT_CONFIDENCE_THRESHOLD
+INTENT_BACKEND = os.getenv("INTENT_BACKEND", "llm").strip().lower()
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", 0.6))
+INTENT_CENTROIDS_PATH = os.getenv(
+    "INTENT_CENTROIDS_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "intent_centroids.json")
+)
+
+# Concurrent identical chat requests (same normalized message and use_rag) share
+# one pipeline execution instead of each running their own LLM calls
+CHAT_COALESCING_ENABLED = os.getenv("CHAT_COALESCING_ENABLED", "true").lower() == "true"
+
+# Semantic response cache (RAG mode): near-identical questions reuse a cached answer
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", 3600))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 512))
+
+# Persistent embedding cache (content-addressed by deployment + chunk text)
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), ".cache", "embeddings.sqlite")
+)
+# Query embeddings are only kept in memory, in an LRU of this many vectors
+EMBEDDING_QUERY_CACHE_SIZE = int(os.getenv("EMBEDDING_QUERY_CACHE_SIZE", 1024))
+
+# Persistent vector store: when set, the Chroma collection and its ingest manifest
+# live in this directory and startup only embeds chunks that are not stored yet
+VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", "")
+
+# Shared index: with CHROMA_SERVER_URL set (e.g. http://localhost:8001 for a server
+# started with `chroma run --path ./chroma-data --port 8001`) every worker uses the
+# collections in that server instead of a private copy. Only one worker at a time
+# syncs the corpus at startup (SHARED_INDEX_LOCK_PATH), so it is embedded once.
+# Documents added through any worker reach the other workers' BM25 indexes and
+# semantic caches within SHARED_INDEX_REFRESH_SECONDS.
+CHROMA_SERVER_URL = os.getenv("CHROMA_SERVER_URL", "")
+SHARED_INDEX_REFRESH_SECONDS = float(os.getenv("SHARED_INDEX_REFRESH_SECONDS", 5))
+SHARED_INDEX_LOCK_PATH = os.getenv(
+    "SHARED_INDEX_LOCK_PATH",
+    os.path.join(os.path.dirname(__file__), ".cache", "shared_index.lock")
+)
+
+# What /chat does with RAG requests while the knowledge base is still being indexed:
+#   queue  - wait up to RAG_WARMUP_TIMEOUT_SECONDS for indexing to finish (default)
+#   direct - answer immediately with a direct LLM call
+RAG_WARMUP_MODE = os.getenv("RAG_WARMUP_MODE", "queue").strip().lower()
+RAG_WARMUP_TIMEOUT_SECONDS = float(os.getenv("RAG_WARMUP_TIMEOUT_SECONDS", 30))
+
+# Bulk ingestion (/documents/batch): documents are split off the event loop and
+# embedded in deployment-sized batches with bounded concurrency. Splitting runs in
+# the default thread pool unless INGEST_SPLIT_WORKERS > 0 starts worker processes
+# (spawned processes re-import the launching script once when started).
+INGEST_SPLIT_WORKERS = int(os.getenv("INGEST_SPLIT_WORKERS", 0))
+INGEST_SPLIT_GROUP_SIZE = int(os.getenv("INGEST_SPLIT_GROUP_SIZE", 32))
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", 128))
+INGEST_EMBED_CONCURRENCY = int(os.getenv("INGEST_EMBED_CONCURRENCY", 4))
+
+# Query embeddings from concurrent requests are sent as one batched call once
+# EMBEDDING_BATCH_MAX_SIZE queries are waiting or the oldest has waited
+# EMBEDDING_BATCH_MAX_WAIT_MS. Off (1) by default: a batched call serves
+# several requests, so its embedding span cannot sit under each request's
+# retrieve_documents span the way Lab 2 shows it
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 1))
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", 5))
+
+# Number of chunks returned by retrieval
+RETRIEVAL_K = 3
+
+# Adaptive top-k: return 1..RETRIEVAL_MAX_K chunks whose cosine similarity to the
+# query is within RETRIEVAL_SCORE_GAP of the best one. RETRIEVAL_MIN_SCORE is a low
+# absolute floor: the best chunk is always used when it reaches it, and only when
+# nothing does is the answer generated without context, using a short system prompt.
+# The cutoff is relative because absolute scores differ a lot between embedding models.
+RETRIEVAL_ADAPTIVE_K = os.getenv("RETRIEVAL_ADAPTIVE_K", "true").lower() == "true"
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", 0.2))
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", 5))
+RETRIEVAL_SCORE_GAP = float(os.getenv("RETRIEVAL_SCORE_GAP", 0.1))
+
+# Context assembly: retrieved chunks are deduplicated (shingle Jaccard similarity
+# >= CONTEXT_DEDUP_THRESHOLD), stripped of splitter overlap and capped at
+# CONTEXT_TOKEN_BUDGET tokens (counted with tiktoken's CONTEXT_TOKEN_ENCODING)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.8))
+CONTEXT_TOKEN_ENCODING = os.getenv("CONTEXT_TOKEN_ENCODING", "o200k_base")
+
+# Retrieval strategy: "vector" (dense only) or "hybrid" (BM25 + vector, fused by
+# reciprocal rank fusion over HYBRID_CANDIDATES results from each side). Vector by
+# default, so chroma.query spans show the n_results the Lab 2 guide describes
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").strip().lower()
+if RETRIEVAL_MODE not in ("vector", "hybrid"):
+    raise ValueError(f"RETRIEVAL_MODE must be 'vector' or 'hybrid', got {RETRIEVAL_MODE!r}")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 10))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+
+# Hybrid mode: answer from BM25 alone, skipping the query embedding, when the top
+# lexical hit contains LEXICAL_FAST_PATH_MIN_COVERAGE of the query terms and beats
+# the runner-up by LEXICAL_FAST_PATH_MARGIN x. Off by default so Lab traces keep
+# their embedding span.
+LEXICAL_FAST_PATH_ENABLED = os.getenv("LEXICAL_FAST_PATH_ENABLED", "false").lower() == "true"
+LEXICAL_FAST_PATH_MIN_COVERAGE = float(os.getenv("LEXICAL_FAST_PATH_MIN_COVERAGE", 1.0))
+LEXICAL_FAST_PATH_MARGIN = float(os.getenv("LEXICAL_FAST_PATH_MARGIN", 1.5))
+
+# Multi-tenancy: a request names its tenant with the X-Tenant-ID header or a
+# /tenants/{tenant_id}/... path prefix; without one it uses the base knowledge
+# base (ATTENDEE_ID). Tenants search the shared base corpus plus the documents
+# they added. Loaded tenants are evicted least recently used beyond
+# TENANT_MAX_LOADED tenants or TENANT_MEMORY_LIMIT_MB of estimated index memory,
+# which also caps the Chroma segment cache of a persistent vector store. Without
+# VECTORSTORE_DIR or CHROMA_SERVER_URL tenant collections stay in the in-memory
+# Chroma client: eviction keeps their documents but only frees the BM25 index and
+# semantic cache, so the memory limit does not bound their vectors.
+TENANT_HEADER = "X-Tenant-ID"
+TENANT_MAX_LOADED = int(os.getenv("TENANT_MAX_LOADED", 64))
+TENANT_MEMORY_LIMIT_MB = float(os.getenv("TENANT_MEMORY_LIMIT_MB", 512))
+
+# Admission control for /chat and /chat/stream: at most CHAT_MAX_CONCURRENCY requests
+# run at once and up to CHAT_MAX_QUEUE more wait CHAT_QUEUE_TIMEOUT_SECONDS for a
+# slot; the rest get 503 with Retry-After. CHAT_MAX_CONCURRENCY=0 disables the limit.
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", 32))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 64))
+CHAT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_QUEUE_TIMEOUT_SECONDS", 10))
+
+# Per-tenant LLM token budget: a token bucket refilled with TENANT_TOKENS_PER_MINUTE
+# that holds up to TENANT_TOKEN_BURST tokens (default: one minute's worth). Every chat
+# request is charged its estimated prompt tokens plus LLM_COMPLETION_TOKENS_ESTIMATE
+# before any LLM call; requests over budget get 429 with Retry-After. 0 disables it.
+TENANT_TOKENS_PER_MINUTE = int(os.getenv("TENANT_TOKENS_PER_MINUTE", 0))
+TENANT_TOKEN_BURST = int(os.getenv("TENANT_TOKEN_BURST", 0)) or TENANT_TOKENS_PER_MINUTE
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", 300))
+
+# Resilient Azure OpenAI calls (replaces the SDK's own retries). Each stage has a
+# deadline covering all of its attempts (generation and the direct path: until the
+# first token when streaming). Retryable failures are retried with jittered backoff
+# up to LLM_MAX_RETRIES times while the retry budget lasts: LLM_RETRY_BUDGET_RATIO
+# retries per call plus LLM_RETRY_MIN_PER_SECOND. A deployment failing
+# LLM_BREAKER_FAILURES times in a row is skipped for LLM_BREAKER_RESET_SECONDS.
+# With AZURE_OPENAI_HEDGE_DEPLOYMENT set, chat calls still running after the
+# LLM_HEDGE_PERCENTILE latency of the primary deployment are also sent there.
+LLM_RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE_ENABLED", "true").lower() == "true"
+LLM_INTENT_DEADLINE_SECONDS = float(os.getenv("LLM_INTENT_DEADLINE_SECONDS", 5))
+LLM_GENERATION_DEADLINE_SECONDS = float(os.getenv("LLM_GENERATION_DEADLINE_SECONDS", 30))
+LLM_EMBEDDING_DEADLINE_SECONDS = float(os.getenv("LLM_EMBEDDING_DEADLINE_SECONDS", 10))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", 0.1))
+LLM_RETRY_MIN_PER_SECOND = float(os.getenv("LLM_RETRY_MIN_PER_SECOND", 1))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", 30))
+AZURE_OPENAI_HEDGE_DEPLOYMENT = os.getenv("AZURE_OPENAI_HEDGE_DEPLOYMENT", "")
+# Hedging is on when a hedge deployment is set; with CHAT_ROUTES it has to be enabled
+# here and hedges only go to another usable deployment of the same tier
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", str(bool(AZURE_OPENAI_HEDGE_DEPLOYMENT))).lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+
+# Model routing: CHAT_ROUTES lists chat deployments as deployment:small|large[:max_inflight],
+# e.g. "gpt-4o-mini:small:64,gpt-4o:large:16". Intent classification goes to a small
+# deployment; answers go to a large one when the intent is in CHAT_ROUTE_LARGE_INTENTS
+# or question plus context exceed CHAT_ROUTE_SMALL_MAX_PROMPT_TOKENS. Within a tier the
+# fastest deployment is preferred; saturated or circuit-open ones are failed over.
+# Unset: every call goes to AZURE_OPENAI_CHAT_DEPLOYMENT (and AZURE_OPENAI_HEDGE_DEPLOYMENT).
+CHAT_ROUTES = os.getenv("CHAT_ROUTES", "")
+CHAT_ROUTE_LARGE_INTENTS = [
+    intent.strip() for intent in os.getenv("CHAT_ROUTE_LARGE_INTENTS", "troubleshooting").split(",") if intent.strip()
+]
+CHAT_ROUTE_SMALL_MAX_PROMPT_TOKENS = int(os.getenv("CHAT_ROUTE_SMALL_MAX_PROMPT_TOKENS", 2000))
+
+# Conversation sessions: a chat request with a session_id continues that conversation.
+# The last SESSION_MAX_RECENT_TURNS turns (at most SESSION_HISTORY_TOKEN_BUDGET tokens)
+# are sent verbatim, older ones are folded into a rolling summary of at most
+# SESSION_SUMMARY_TOKEN_BUDGET tokens. Up to SESSION_MAX_SESSIONS sessions are kept in
+# memory (LRU) for SESSION_TTL_SECONDS after their last turn; SESSION_STORE_PATH adds
+# a SQLite file that keeps them across restarts and evictions.
+SESSION_MAX_RECENT_TURNS = int(os.getenv("SESSION_MAX_RECENT_TURNS", 4))
+SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", 1000))
+SESSION_SUMMARY_TOKEN_BUDGET = int(os.getenv("SESSION_SUMMARY_TOKEN_BUDGET", 300))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", 3600))
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "")
+
 # Lifespan event handler (replaces deprecated @app.on_event)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -144,9 +375,26 @@ async def lifespan(app: FastAPI):
     ║         Service: ai-chat-service-{ATTENDEE_ID:<28}║
     ╚══════════════════════════════════════════════════════════════════════╝
     """)
-    initialize_rag()
+    # Index the knowledge base in the background so /health answers immediately;
+    # readiness is reported by /ready
+    global rag_init_task
+    rag_init_task = asyncio.create_task(asyncio.to_thread(initialize_rag))
+    refresh_task = None
+    if CHROMA_SERVER_URL:
+        refresh_task = asyncio.create_task(refresh_shared_index())
+    elif APP_WORKERS > 1:
+        logger.warning("Several workers without CHROMA_SERVER_URL: each one indexes a private copy", extra={
+            "workers": APP_WORKERS
+        })
     yield
     # Shutdown
+    if refresh_task is not None:
+        refresh_task.cancel()
+    await clients.aclose()
+    if split_pool is not None:
+        split_pool.shutdown(wait=False, cancel_futures=True)
+    # Flush the last delta export
+    service_metrics.meter_provider.shutdown()
     logger.info("AI Chat Service shutting down", extra={"attendee_id": ATTENDEE_ID})
 
 # Initialize FastAPI app with attendee-specific naming
@@ -166,6 +414,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# /tenants/{tenant_id}/chat etc. are served by the regular endpoints for that tenant
+app.add_middleware(TenantPathMiddleware)
+
 # Mount static files for UI
 STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
 if os.path.exists(STATIC_DIR):
@@ -179,12 +430,17 @@ class ChatRequest(BaseModel):
     """Request model for chat endpoint"""
     message: str
     use_rag: bool = True
+    # Continue this conversation, or start one with new_session (its id comes back in the response)
+    session_id: Optional[str] = None
+    new_session: bool = False
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint"""
     response: str
     attendee_id: str
     sources: Optional[List[str]] = None
+    session_id: Optional[str] = None
+    prompt_tokens: Optional[int] = None
 
 class DocumentRequest(BaseModel):
     """Request model for adding documents"""
@@ -254,6 +510,118 @@ vectorstore = None
 qa_chain = None
 retriever = None
 llm = None
+ingest_manifest = None
+query_batcher = None
+lexical_index = None
+context_builder = None
+chroma_client = None
+
+# The base knowledge base as a Tenant, and the LRU of other loaded tenants
+base_tenant = None
+tenant_registry = None
+
+# Local intent classifier (INTENT_BACKEND=local)
+intent_classifier = None
+if INTENT_BACKEND == "local":
+    intent_classifier = LocalIntentClassifier(
+        load_centroids(INTENT_CENTROIDS_PATH, AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
+    )
+    logger.info("Local intent classifier enabled", extra={
+        "intent_model": "centroid" if intent_classifier.needs_embedding else "keyword",
+        "intent_confidence_threshold": INTENT_CONFIDENCE_THRESHOLD
+    })
+
+# In-flight chat executions shared by identical concurrent requests
+chat_flights = SingleFlight()
+stream_flights = SingleFlight()
+
+# Document splitting shared by startup indexing and /documents
+text_splitter = make_text_splitter()
+
+# Serializes writes to the vector store and ingest manifest
+index_write_lock = asyncio.Lock()
+
+# Worker processes for /documents/batch chunk splitting, started on first use
+split_pool = None
+
+# Chat and embedding clients are built once and share one connection pool
+clients = ClientRegistry(
+    endpoint=AZURE_OPENAI_ENDPOINT,
+    api_key=AZURE_OPENAI_API_KEY,
+    api_version=AZURE_OPENAI_API_VERSION,
+    max_connections=AZURE_OPENAI_POOL_MAX_CONNECTIONS,
+    max_keepalive_connections=AZURE_OPENAI_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=AZURE_OPENAI_POOL_KEEPALIVE_EXPIRY,
+    http2=AZURE_OPENAI_HTTP2,
+    timeout=AZURE_OPENAI_TIMEOUT_SECONDS,
+    tokenize_embeddings=AZURE_OPENAI_EMBEDDING_TOKENIZE,
+    max_retries=0 if LLM_RESILIENCE_ENABLED else 2
+)
+
+# Deadlines, retries, circuit breakers and hedging for Azure OpenAI calls
+resilient_caller = None
+if LLM_RESILIENCE_ENABLED:
+    resilient_caller = ResilientCaller(
+        max_retries=LLM_MAX_RETRIES,
+        retry_budget_ratio=LLM_RETRY_BUDGET_RATIO,
+        retry_min_per_second=LLM_RETRY_MIN_PER_SECOND,
+        failure_threshold=LLM_BREAKER_FAILURES,
+        reset_timeout=LLM_BREAKER_RESET_SECONDS,
+        hedge_percentile=LLM_HEDGE_PERCENTILE,
+        on_event=lambda event, stage: service_metrics.llm_resilience_events.add(1, {"event": event, "stage": stage})
+    )
+# Chat deployments in order of preference; the second one receives hedged calls
+chat_deployments = [AZURE_OPENAI_CHAT_DEPLOYMENT] + (
+    [AZURE_OPENAI_HEDGE_DEPLOYMENT] if AZURE_OPENAI_HEDGE_DEPLOYMENT else []
+)
+# The routing decision of every call without CHAT_ROUTES
+static_route = RoutingDecision(chat_deployments, "default", "static", AZURE_OPENAI_HEDGE_DEPLOYMENT or None)
+
+# Per-call choice of chat deployment (see CHAT_ROUTES)
+model_router = None
+if CHAT_ROUTES:
+    model_router = ModelRouter(
+        parse_routes(CHAT_ROUTES),
+        large_intents=CHAT_ROUTE_LARGE_INTENTS,
+        small_max_prompt_tokens=CHAT_ROUTE_SMALL_MAX_PROMPT_TOKENS,
+        is_available=(lambda deployment: resilient_caller.breaker(deployment).allow()) if resilient_caller else None
+    )
+
+# Admission control (see CHAT_MAX_CONCURRENCY and TENANT_TOKENS_PER_MINUTE)
+chat_limiter = None
+if CHAT_MAX_CONCURRENCY > 0:
+    chat_limiter = ConcurrencyLimiter(
+        CHAT_MAX_CONCURRENCY,
+        max_queue=CHAT_MAX_QUEUE,
+        queue_timeout=CHAT_QUEUE_TIMEOUT_SECONDS,
+        on_queue_change=service_metrics.admission_queue_depth.add,
+        on_admit=service_metrics.admission_queue_wait.record
+    )
+token_budgets = TokenBudgets(TENANT_TOKENS_PER_MINUTE, TENANT_TOKEN_BURST) if TENANT_TOKENS_PER_MINUTE > 0 else None
+# Token counts of the fixed prompt parts, filled on first use
+prompt_token_counts = {}
+
+# Background RAG initialization and its progress, reported by /ready
+rag_init_task = None
+rag_status = {"state": "starting", "chunks_embedded": 0, "chunks_total": 0, "error": None}
+
+semantic_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+)
+
+# Server-side conversation history (see SESSION_MAX_RECENT_TURNS)
+session_store = SessionStore(
+    summarize=lambda summary, turns: summarize_conversation(summary, turns),
+    count_tokens=lambda text: count_tokens(text),
+    max_recent_turns=SESSION_MAX_RECENT_TURNS,
+    history_token_budget=SESSION_HISTORY_TOKEN_BUDGET,
+    summary_token_budget=SESSION_SUMMARY_TOKEN_BUDGET,
+    max_sessions=SESSION_MAX_SESSIONS,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    path=SESSION_STORE_PATH or None
+)
 
 def format_docs(docs):
     """Format retrieved documents into a single string"""
@@ -273,30 +641,210 @@ except ImportError:
     def workflow(name): return lambda f: f
     def task(name): return lambda f: f
 
+def timed_stage(stage: str, mode: str = "rag"):
+    """Record the decorated pipeline step in the chat.stage.duration histogram"""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    service_metrics.record_stage(stage, mode, time.perf_counter() - started)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    service_metrics.record_stage(stage, mode, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def set_span_attributes(attributes: dict):
+    """Set attributes on the current span (no-op when tracing is not active)"""
+    span = trace.get_current_span()
+    if span.is_recording():
+        for key, value in attributes.items():
+            span.set_attribute(key, value)
+
+def record_embedding_batch(size: int, queue_waits: List[float]):
+    """Histogram hook for EmbeddingBatcher"""
+    service_metrics.embedding_batch_size.record(size)
+    for wait in queue_waits:
+        service_metrics.embedding_queue_wait.record(wait)
+
+async def embed_query(query: str) -> List[float]:
+    """Embed a query, micro-batched with concurrent queries when batching is enabled"""
+    if query_batcher is not None:
+        return await query_batcher.embed_query(query)
+    return await embeddings.aembed_query(query)
+
+def semantic_cache_active() -> bool:
+    # Checked before calling lookup_cached_response, so a disabled cache adds no
+    # semantic_cache_lookup span to the trace tree Lab 2 walks through
+    return SEMANTIC_CACHE_ENABLED and embeddings is not None
+
+@task(name="semantic_cache_lookup")
+async def lookup_cached_response(query: str, tenant: Tenant) -> tuple:
+    """
+    Step 0: Embed the query and look for a semantically equivalent cached answer
+    in the tenant's cache (only called when semantic_cache_active())
+    Returns (query_embedding, cache_entry)
+    """
+    cache = tenant.semantic_cache
+    query_embedding = await embed_query(query)
+    entry, similarity = cache.lookup(query_embedding)
+    set_span_attributes({
+        "cache.semantic.hit": entry is not None,
+        "cache.semantic.similarity": similarity,
+        "cache.semantic.threshold": cache.threshold,
+        "cache.semantic.entries": len(cache)
+    })
+    logger.info("Semantic cache lookup", extra={
+        "cache_hit": entry is not None,
+        "cache_similarity": round(similarity, 4),
+        "cache_threshold": cache.threshold,
+        "cache_entries": len(cache),
+        "tenant_id": tenant.tenant_id
+    })
+    return query_embedding, entry
+
+def knowledge_sources(tenant: Optional[Tenant]) -> list:
+    """(chromadb collection, BM25 index) pairs a tenant searches: the shared base corpus, then its own documents"""
+    sources = [(base_tenant.collection, lexical_index)]
+    if tenant is not None and tenant is not base_tenant and tenant.collection is not None:
+        sources.append((tenant.collection, tenant.lexical_index))
+    return sources
+
 @task(name="retrieve_documents")
-def retrieve_documents(query: str) -> list:
+@timed_stage("retrieval")
+async def retrieve_documents(query: str, query_embedding: Optional[List[float]] = None,
+                             tenant: Optional[Tenant] = None) -> list:
     """
     Step 1: Retrieve relevant documents from vector store
-    This generates embedding + vector search spans
+    This generates embedding + vector search spans (the embedding call is
+    skipped when the query was already embedded for the semantic cache).
+    A tenant's own documents are searched together with the base corpus.
     """
     if not retriever:
         logger.warning("Document retrieval skipped - retriever not initialized")
         return []
-    docs = retriever.invoke(query)
+    sources = knowledge_sources(tenant)
+    scores = None
+    if lexical_index is not None:
+        docs, path, scores = await hybrid_search(query, query_embedding, sources)
+    elif RETRIEVAL_ADAPTIVE_K or len(sources) > 1:
+        path = "vector"
+        if query_embedding is None:
+            query_embedding = await embed_query(query)
+        scored = await asyncio.to_thread(
+            search_many_with_similarity, [collection for collection, _ in sources], query_embedding,
+            RETRIEVAL_MAX_K if RETRIEVAL_ADAPTIVE_K else RETRIEVAL_K
+        )
+        ranked = [(doc, score) for _, doc, score in scored]
+        if RETRIEVAL_ADAPTIVE_K:
+            selected = select_adaptive_k(ranked, RETRIEVAL_MIN_SCORE, RETRIEVAL_MAX_K, RETRIEVAL_SCORE_GAP)
+        else:
+            selected = ranked[:RETRIEVAL_K]
+        docs, scores = [doc for doc, _ in selected], [score for _, score in selected]
+    else:
+        path = "vector"
+        if query_embedding is None and query_batcher is not None:
+            query_embedding = await embed_query(query)
+        if query_embedding is not None:
+            docs = await vectorstore.asimilarity_search_by_vector(query_embedding, k=RETRIEVAL_K)
+        else:
+            docs = await retriever.ainvoke(query)
+    attributes = {"retrieval.path": path, "retrieval.k": len(docs), "retrieval.sources": len(sources)}
+    if scores is not None:
+        attributes.update({
+            "retrieval.scores": [round(score, 4) for score in scores],
+            "retrieval.min_score": RETRIEVAL_MIN_SCORE
+        })
+    set_span_attributes(attributes)
     logger.info("Documents retrieved from vector store", extra={
         "query_length": len(query),
-        "documents_found": len(docs)
+        "documents_found": len(docs),
+        "retrieval_path": path,
+        "top_score": round(scores[0], 4) if scores else None
     })
     return docs
 
+async def hybrid_search(query: str, query_embedding: Optional[List[float]], sources: list) -> tuple:
+    """
+    BM25 + vector search over the (vector store, BM25 index) sources, fused by
+    reciprocal rank fusion. Returns (docs, path, scores) where path is
+    "lexical" when the BM25 result was decisive and the query embedding was
+    skipped, "hybrid" otherwise. scores are the cosine similarities of the
+    returned docs (None on the lexical path).
+    """
+    owners = {}
+    lexical_hits = []
+    for _, index in sources:
+        for doc_id, score in index.search(query, HYBRID_CANDIDATES):
+            if doc_id not in owners:
+                owners[doc_id] = index
+                lexical_hits.append((doc_id, score))
+    if len(sources) > 1:
+        lexical_hits = sorted(lexical_hits, key=lambda hit: hit[1], reverse=True)[:HYBRID_CANDIDATES]
+    if query_embedding is None and LEXICAL_FAST_PATH_ENABLED and lexical_hits and \
+            is_decisive(owners[lexical_hits[0][0]], query, lexical_hits,
+                        LEXICAL_FAST_PATH_MIN_COVERAGE, LEXICAL_FAST_PATH_MARGIN):
+        return [owners[doc_id].document(doc_id) for doc_id, _ in lexical_hits[:RETRIEVAL_K]], "lexical", None
+    
+    if query_embedding is None:
+        query_embedding = await embed_query(query)
+    lexical_ids = [doc_id for doc_id, _ in lexical_hits]
+    # Lexical-only hits are scored too, so the similarity cutoff applies to every candidate
+    scored = await asyncio.to_thread(
+        search_many_with_similarity, [collection for collection, _ in sources], query_embedding, HYBRID_CANDIDATES,
+        [[doc_id for doc_id in lexical_ids if owners[doc_id] is index] for _, index in sources]
+    )
+    candidates = {doc_id: (doc, score) for doc_id, doc, score in scored}
+    # A chunk deleted since the BM25 index last caught up has no stored vector
+    lexical_ids = [doc_id for doc_id in lexical_ids if doc_id in candidates]
+    # Dense ranking of the whole candidate pool
+    vector_ids = sorted(candidates, key=lambda doc_id: candidates[doc_id][1], reverse=True)
+    fused = [candidates[doc_id] for doc_id in reciprocal_rank_fusion([vector_ids, lexical_ids], k=HYBRID_RRF_K)]
+    if RETRIEVAL_ADAPTIVE_K:
+        selected = select_adaptive_k(fused, RETRIEVAL_MIN_SCORE, RETRIEVAL_MAX_K, RETRIEVAL_SCORE_GAP)
+    else:
+        selected = fused[:RETRIEVAL_K]
+    return [doc for doc, _ in selected], "hybrid", [score for _, score in selected]
+
 @task(name="generate_context")
+@timed_stage("context")
 def generate_context(docs: list) -> str:
     """
     Step 2: Format retrieved documents into context string
+    Near-duplicate chunks and splitter overlap are removed and the result is
+    kept within CONTEXT_TOKEN_BUDGET tokens
     """
     if not docs:
         return "No relevant context found."
-    return format_docs(docs)
+    if context_builder is None:
+        return format_docs(docs)
+    context, stats = context_builder.build(docs)
+    set_span_attributes({
+        "context.tokens": stats.tokens,
+        "context.tokens_exact": context_builder.counter.exact,
+        "context.chunks_used": stats.chunks_used,
+        "context.chunks_duplicate": stats.chunks_duplicate,
+        "context.chunks_over_budget": stats.chunks_over_budget
+    })
+    service_metrics.context_tokens.record(stats.tokens)
+    logger.info("Context assembled", extra={
+        "context_tokens": stats.tokens,
+        "chunks_retrieved": len(docs),
+        "chunks_used": stats.chunks_used,
+        "chunks_duplicate": stats.chunks_duplicate,
+        "chunks_over_budget": stats.chunks_over_budget,
+        "overlap_chars_trimmed": stats.overlap_chars_trimmed
+    })
+    return context
 
 # Extended system prompt for Azure OpenAI prompt caching (requires 1,024+ tokens)
 RAG_SYSTEM_PROMPT = """You are an expert AI assistant for the Dynatrace AI Observability Workshop, 
@@ -400,16 +948,75 @@ When answering questions, follow these principles:
 6. **Formatting**: Use markdown for code blocks, lists, headers, and emphasis
 7. **Conciseness**: Be thorough but avoid unnecessary verbosity
 8. **Context-aware**: Reference the provided context when relevant to the question
+"""
 
-## Context from Knowledge Base
+# Per-request part of the prompt. It goes last, after the static system prompt above,
+# so the whole system prompt is a stable prefix that Azure OpenAI can serve from cache.
+RAG_USER_PROMPT = """## Context from Knowledge Base
 {context}
 
 Based on the context above and your expertise, provide a helpful response to the user's question.
 If the context doesn't contain relevant information, draw upon your knowledge of the topics listed above.
-"""
+
+## Question
+{question}"""
+
+def route_chat(stage: str, intent: Optional[str] = None, prompt_tokens: int = 0) -> RoutingDecision:
+    """Chat deployments for one call in order of preference; the routing decision goes on the current span"""
+    if model_router is None:
+        return static_route
+    decision = model_router.route(stage, intent, prompt_tokens)
+    set_span_attributes({
+        "llm.route.deployment": decision.deployments[0],
+        "llm.route.tier": decision.tier,
+        "llm.route.reason": decision.reason
+    })
+    service_metrics.llm_route_decisions.add(1, {
+        "deployment": decision.deployments[0],
+        "tier": decision.tier,
+        "failover": "failover=" in decision.reason
+    })
+    return decision
+
+def chat_attempt(messages):
+    """ainvoke on a deployment, tracked by the model router when routing is enabled"""
+    if model_router is None:
+        return lambda deployment: clients.chat(deployment).ainvoke(messages)
+    return lambda deployment: model_router.run(deployment, lambda: clients.chat(deployment).ainvoke(messages))
+
+def chat_stream_start(messages, **kwargs):
+    """astream on a deployment, tracked by the model router when routing is enabled"""
+    if model_router is None:
+        return lambda deployment: clients.chat(deployment).astream(messages, **kwargs)
+    return lambda deployment: model_router.stream(deployment, clients.chat(deployment).astream(messages, **kwargs))
+
+async def invoke_chat(stage: str, messages, deadline: float, route: Optional[RoutingDecision] = None):
+    """Chat completion on the routed deployments through the resilience layer (when enabled)"""
+    route = route or route_chat(stage)
+    if resilient_caller is None:
+        return await chat_attempt(messages)(route.deployments[0])
+    return await resilient_caller.call(
+        stage, route.deployments, chat_attempt(messages), deadline,
+        hedge_to=route.hedge_to if LLM_HEDGE_ENABLED else None
+    )
+
+def stream_chat(stage: str, messages, deadline: float, route: Optional[RoutingDecision] = None, **kwargs):
+    """Streamed chat completion; deadline, retries and breakers apply until the first chunk (never hedged)"""
+    route = route or route_chat(stage)
+    if resilient_caller is None:
+        return chat_stream_start(messages, **kwargs)(route.deployments[0])
+    return resilient_caller.stream(stage, route.deployments, chat_stream_start(messages, **kwargs), deadline)
+
+def route_generation(question: str, context: Optional[str], intent: Optional[str]) -> RoutingDecision:
+    """Route an answer by its classified intent and the length of question plus context"""
+    if model_router is None:
+        return static_route
+    prompt_tokens = count_tokens(question) + (count_tokens(context) if context else 0)
+    return route_chat("generation", intent, prompt_tokens)
 
 @task(name="generate_response")
-def generate_response(question: str, context: str) -> str:
+async def generate_response(question: str, context: Optional[str], intent: Optional[str] = None,
+                            history: Optional[tuple] = None) -> str:
     """
     Step 3: Generate LLM response with context
     This generates the main LLM completion span
@@ -417,19 +1024,128 @@ def generate_response(question: str, context: str) -> str:
     if not llm:
         raise ValueError("LLM not initialized")
     
+    started = time.perf_counter()
+    route = route_generation(question, context, intent)
+    response = await invoke_chat(
+        "generation", build_rag_messages(question, context, history), LLM_GENERATION_DEADLINE_SECONDS, route
+    )
+    duration = time.perf_counter() - started
+    service_metrics.record_stage("generation", "rag", duration)
+    record_prompt_cache_usage(response, duration)
+    return response.content
+
+@task(name="generate_response_stream")
+async def generate_response_stream(question: str, context: Optional[str], intent: Optional[str] = None,
+                                   history: Optional[tuple] = None):
+    """
+    Step 3 (streaming): Yield LLM response tokens as they are generated
+    The LLM span stays open until the last token has been sent
+    """
+    if not llm:
+        raise ValueError("LLM not initialized")
+    
+    started = time.perf_counter()
+    usage_chunk = None
+    # stream_usage asks for a final chunk carrying token usage (incl. cached tokens)
+    messages = build_rag_messages(question, context, history)
+    route = route_generation(question, context, intent)
+    async for chunk in stream_chat("generation", messages, LLM_GENERATION_DEADLINE_SECONDS, route,
+                                   stream_usage=True):
+        if chunk.usage_metadata:
+            usage_chunk = chunk
+        if chunk.content:
+            yield chunk.content
+    duration = time.perf_counter() - started
+    service_metrics.record_stage("generation", "rag", duration)
+    record_prompt_cache_usage(usage_chunk, duration)
+
+# Used instead of the RAG prompts when retrieval found nothing relevant enough
+LEAN_SYSTEM_PROMPT = """You are an expert AI assistant for the Dynatrace AI Observability Workshop,
+specializing in observability, distributed tracing and AI/LLM monitoring.
+No knowledge base content matched this question, so answer concisely from general
+knowledge and say so when you are not certain."""
+
+def build_rag_messages(question: str, context: Optional[str], history: Optional[tuple] = None) -> list:
+    """
+    Build the chat messages sent to the LLM for a RAG answer
+    
+    The system message is identical for every request (1,024+ tokens enables
+    Azure OpenAI prompt caching); conversation history (a session's summary and
+    recent turns), retrieved context and the question come after it.
+    Without context (None) a short system prompt and the bare question are sent.
+    """
     # Use chat messages format for cleaner trace capture
     from langchain_core.messages import SystemMessage, HumanMessage
     
-    # Use extended system prompt (1,024+ tokens enables Azure OpenAI prompt caching)
-    system_prompt = RAG_SYSTEM_PROMPT.format(context=context)
-    
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=question)
+    if context is None:
+        return [SystemMessage(content=LEAN_SYSTEM_PROMPT), *history_messages(history), HumanMessage(content=question)]
+    return [
+        SystemMessage(content=RAG_SYSTEM_PROMPT),
+        *history_messages(history),
+        HumanMessage(content=RAG_USER_PROMPT.format(context=context, question=question))
     ]
+
+def history_messages(history: Optional[tuple]) -> list:
+    """Chat messages for a session's (summary, recent turns); empty without a session"""
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
     
-    response = llm.invoke(messages)
-    return response.content
+    if not history:
+        return []
+    summary, turns = history
+    messages = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] if summary else []
+    for question, answer in turns:
+        messages += [HumanMessage(content=question), AIMessage(content=answer)]
+    return messages
+
+def build_direct_messages(question: str, history: Optional[tuple] = None):
+    """The direct (non-RAG) prompt: the bare question, after the session history if there is one"""
+    from langchain_core.messages import HumanMessage
+    
+    if not history:
+        return question
+    return [*history_messages(history), HumanMessage(content=question)]
+
+def count_prompt_tokens(messages) -> int:
+    """Tokens of the text sent as a prompt (message overhead not included)"""
+    if isinstance(messages, str):
+        return count_tokens(messages)
+    return sum(count_tokens(message.content) for message in messages)
+
+SESSION_SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an
+observability assistant. Keep the facts, names, decisions and open questions the user
+may refer back to. Write at most {max_words} words and respond with the summary only.
+
+## Summary so far
+{summary}
+
+## Newer turns
+{turns}"""
+
+async def summarize_conversation(summary: str, turns: List[List[str]]) -> str:
+    """Fold turns into a session's rolling summary (one small LLM call)"""
+    from langchain_core.messages import HumanMessage
+    
+    prompt = SESSION_SUMMARY_PROMPT.format(
+        max_words=SESSION_SUMMARY_TOKEN_BUDGET * 3 // 4,
+        summary=summary or "(none)",
+        turns="\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+    )
+    result = await invoke_chat("summary", [HumanMessage(content=prompt)], LLM_GENERATION_DEADLINE_SECONDS)
+    return result.content.strip()
+
+def record_prompt_cache_usage(message, duration_seconds: float):
+    """Record prompt cache usage of an LLM response on the current span and as metrics"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    cached_tokens = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    # Not gen_ai.usage.*: the child LLM span already carries those, and token queries would count them twice
+    set_span_attributes({
+        "llm.prompt_cache.input_tokens": input_tokens,
+        "llm.prompt_cache.cached_tokens": cached_tokens
+    })
+    service_metrics.llm_input_tokens.add(input_tokens)
+    service_metrics.llm_cached_tokens.add(cached_tokens)
+    service_metrics.llm_generation_duration.record(duration_seconds, {"prompt_cache.hit": cached_tokens > 0})
 
 def summarize_sources(docs: list) -> list:
     """
@@ -440,11 +1156,26 @@ def summarize_sources(docs: list) -> list:
     return [doc.page_content[:100] + "..." for doc in docs]
 
 @task(name="analyze_query_intent")
-def analyze_query_intent(query: str) -> dict:
+@timed_stage("intent")
+async def analyze_query_intent(query: str, query_embedding: Optional[List[float]] = None) -> dict:
     """
     Step 5: Quick LLM call to classify query intent
     This adds an additional LLM span for richer traces
+    
+    With INTENT_BACKEND=local the query is classified in-process first and the
+    LLM is only asked when the local model is not confident enough.
     """
+    if intent_classifier is not None:
+        label, confidence, model = intent_classifier.classify(query, query_embedding)
+        confident = confidence >= INTENT_CONFIDENCE_THRESHOLD
+        set_span_attributes({
+            "intent.model": model if confident else "llm",
+            "intent.local_label": label,
+            "intent.local_confidence": confidence
+        })
+        if confident:
+            return {"intent": label, "query": query, "confidence": confidence, "model": model}
+    
     if not llm:
         return {"intent": "unknown", "confidence": 0}
     
@@ -457,52 +1188,99 @@ def analyze_query_intent(query: str) -> dict:
     
     Query: {query}"""
     
-    result = llm.invoke([HumanMessage(content=classification_prompt)])
-    return {"intent": result.content.strip().lower(), "query": query}
+    result = await invoke_chat("intent", [HumanMessage(content=classification_prompt)], LLM_INTENT_DEADLINE_SECONDS)
+    return {"intent": result.content.strip().lower(), "query": query, "model": "llm"}
 
 def initialize_rag():
     """Initialize the RAG components with sample documents"""
-    global embeddings, vectorstore, qa_chain, retriever, llm
+    global embeddings, vectorstore, qa_chain, retriever, llm, ingest_manifest, query_batcher, lexical_index, context_builder
+    global chroma_client, base_tenant, tenant_registry
+    
+    rag_status.update(state="indexing", error=None)
+    
+    def report_progress(done: int, total: int):
+        rag_status.update(chunks_embedded=done, chunks_total=total)
     
     try:
-        # Initialize Azure OpenAI embeddings
-        embeddings = AzureOpenAIEmbeddings(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            azure_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-            api_version=AZURE_OPENAI_API_VERSION
-        )
-        
-        # Create text splitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
+        # Initialize Azure OpenAI embeddings behind the persistent embedding cache
+        embedding_client = clients.embeddings(AZURE_OPENAI_EMBEDDING_DEPLOYMENT)
+        if resilient_caller is not None:
+            embedding_client = ResilientEmbeddings(
+                embedding_client, resilient_caller, AZURE_OPENAI_EMBEDDING_DEPLOYMENT, LLM_EMBEDDING_DEADLINE_SECONDS
+            )
+        embeddings = CachedEmbeddings(
+            embedding_client,
+            namespace=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+            path=EMBEDDING_CACHE_PATH,
+            max_queries=EMBEDDING_QUERY_CACHE_SIZE
         )
+        if EMBEDDING_BATCH_MAX_SIZE > 1:
+            query_batcher = EmbeddingBatcher(
+                embeddings,
+                max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+                max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS,
+                on_batch=record_embedding_batch
+            )
         
         # Split documents
         docs = text_splitter.create_documents(SAMPLE_DOCUMENTS)
         
-        # Create vector store
-        vectorstore = Chroma.from_documents(
-            documents=docs,
-            embedding=embeddings,
-            collection_name=f"workshop_{ATTENDEE_ID}"
+        # Open the vector store (persistent when VECTORSTORE_DIR is set) and
+        # embed + insert only the chunks it does not hold yet
+        base_collection = f"workshop_{ATTENDEE_ID}"
+        manifest_path = None
+        if VECTORSTORE_DIR and not CHROMA_SERVER_URL:
+            os.makedirs(VECTORSTORE_DIR, exist_ok=True)
+            manifest_path = os.path.join(VECTORSTORE_DIR, f"{base_collection}.manifest.json")
+        # One Chroma client serves the base collection and every tenant collection
+        chroma_client = open_chroma_client(
+            VECTORSTORE_DIR or None,
+            memory_limit_bytes=int(TENANT_MEMORY_LIMIT_MB * 1024 * 1024),
+            server_url=CHROMA_SERVER_URL or None
+        )
+        store = Chroma(
+            client=chroma_client,
+            collection_name=base_collection,
+            embedding_function=embeddings
+        )
+        ingest_manifest = IngestManifest(manifest_path)
+        # Workers sharing a Chroma server take turns, so the first one embeds the
+        # corpus and the others find it already stored
+        with process_lock(SHARED_INDEX_LOCK_PATH if CHROMA_SERVER_URL else None):
+            index_stats = sync_corpus(store, ingest_manifest, docs, on_progress=report_progress)
+        if RETRIEVAL_MODE == "hybrid":
+            # Index everything the collection holds, including documents added at runtime
+            stored = store.get(include=["documents", "metadatas"])
+            index = BM25Index()
+            index.rebuild(stored["ids"], stored["documents"], stored["metadatas"])
+            lexical_index = index
+        vectorstore = store
+        base_tenant = Tenant(ATTENDEE_ID, store, ingest_manifest, lexical_index, semantic_cache,
+                             write_lock=index_write_lock, collection=chroma_client.get_collection(base_collection))
+        tenant_registry = TenantRegistry(
+            load_tenant,
+            max_tenants=TENANT_MAX_LOADED,
+            max_memory_bytes=int(TENANT_MEMORY_LIMIT_MB * 1024 * 1024)
+        )
+        
+        # Loading the tiktoken encoding may download it, so it happens here, off the event loop
+        context_builder = ContextBuilder(
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            dedup_threshold=CONTEXT_DEDUP_THRESHOLD,
+            counter=TokenCounter(CONTEXT_TOKEN_ENCODING)
         )
         
         # Create retriever
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+        retriever = vectorstore.as_retriever(search_kwargs={"k": RETRIEVAL_K})
         
         # Initialize Azure OpenAI LLM (stored globally for reuse)
-        llm = AzureChatOpenAI(
-            azure_endpoint=AZURE_OPENAI_ENDPOINT,
-            api_key=AZURE_OPENAI_API_KEY,
-            azure_deployment=AZURE_OPENAI_CHAT_DEPLOYMENT,
-            api_version=AZURE_OPENAI_API_VERSION,
-            temperature=0.7
-        )
+        llm = clients.chat(AZURE_OPENAI_CHAT_DEPLOYMENT)
         
         # Create prompt template (uses extended system prompt for caching)
-        prompt = ChatPromptTemplate.from_template(RAG_SYSTEM_PROMPT + "\n\nQuestion: {question}\n\nAnswer:")
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", RAG_SYSTEM_PROMPT),
+            ("human", RAG_USER_PROMPT)
+        ])
         
         # Create RAG chain using LCEL
         qa_chain = (
@@ -512,16 +1290,31 @@ def initialize_rag():
             | StrOutputParser()
         )
         
+        cache_stats = embeddings.stats()
         logger.info("RAG system initialized successfully", extra={
             "attendee_id": ATTENDEE_ID,
             "embedding_model": AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
             "chat_model": AZURE_OPENAI_CHAT_DEPLOYMENT,
-            "document_count": len(SAMPLE_DOCUMENTS)
+            "document_count": len(SAMPLE_DOCUMENTS),
+            "vectorstore_persistent": bool(VECTORSTORE_DIR),
+            "vectorstore_shared": bool(CHROMA_SERVER_URL),
+            "chunks_added": index_stats["added"],
+            "chunks_removed": index_stats["removed"],
+            "chunks_unchanged": index_stats["unchanged"],
+            "embedding_cache_hits": cache_stats["hits"],
+            "embedding_cache_misses": cache_stats["misses"],
+            "embedding_cache_hit_ratio": cache_stats["hit_ratio"]
         })
+        rag_status.update(state="ready")
         print(f"✅ RAG initialized successfully for attendee: {ATTENDEE_ID}")
+        print(f"   Vector store: {index_stats['added']} added / {index_stats['removed']} removed / "
+              f"{index_stats['unchanged']} unchanged chunks")
+        print(f"   Embedding cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+              f"({cache_stats['hit_ratio']:.0%} hit ratio)")
         return True
         
     except Exception as e:
+        rag_status.update(state="failed", error=str(e))
         logger.error("Failed to initialize RAG system", extra={
             "attendee_id": ATTENDEE_ID,
             "error": str(e)
@@ -556,31 +1349,496 @@ async def health_check():
         service_name=f"ai-chat-service-{ATTENDEE_ID}"
     )
 
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-flight
+background_tasks = set()
+
+def run_in_background(coro) -> asyncio.Task:
+    """Schedule a coroutine without awaiting it, logging any failure"""
+    bg_task = asyncio.create_task(coro)
+    background_tasks.add(bg_task)
+
+    def _done(t: asyncio.Task):
+        background_tasks.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.warning("Background task failed", extra={"error": str(t.exception())})
+
+    bg_task.add_done_callback(_done)
+    return bg_task
+
+async def analyze_and_retrieve(message: str, query_embedding: Optional[List[float]] = None,
+                               tenant: Optional[Tenant] = None) -> tuple:
+    """
+    Steps 1 + 2: Analyze query intent (LLM span) and retrieve relevant
+    documents (embedding + search spans), scheduled per INTENT_SCHEDULING
+
+    Returns (retrieved_docs, intent); intent is None when it is classified in
+    the background and so not known yet.
+    """
+    if query_embedding is None and intent_classifier is not None \
+            and intent_classifier.needs_embedding and embeddings:
+        # Embed once and share the vector between the centroid model and retrieval
+        query_embedding = await embed_query(message)
+    
+    if INTENT_SCHEDULING == "sequential":
+        intent = await analyze_query_intent(message, query_embedding)
+        return await retrieve_documents(message, query_embedding, tenant), intent.get("intent")
+    if INTENT_SCHEDULING == "background":
+        run_in_background(analyze_query_intent(message, query_embedding))
+        return await retrieve_documents(message, query_embedding, tenant), None
+    intent, retrieved_docs = await asyncio.gather(
+        analyze_query_intent(message, query_embedding),
+        retrieve_documents(message, query_embedding, tenant)
+    )
+    return retrieved_docs, intent.get("intent")
+
+async def wait_for_rag():
+    """
+    Hold a RAG request until background indexing finishes (RAG_WARMUP_MODE=queue).
+    If RAG is still not ready afterwards the request is answered in direct mode.
+    """
+    if RAG_WARMUP_MODE != "queue" or rag_init_task is None or rag_init_task.done():
+        return
+    try:
+        await asyncio.wait_for(asyncio.shield(rag_init_task), timeout=RAG_WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("RAG still initializing, falling back to direct mode", extra={
+            "chunks_embedded": rag_status["chunks_embedded"],
+            "chunks_total": rag_status["chunks_total"]
+        })
+
+def requested_tenant_id(request: Request) -> str:
+    """Tenant named by the /tenants/{tenant_id} path prefix or the X-Tenant-ID header (default: ATTENDEE_ID)"""
+    tenant_id = getattr(request.state, "tenant_id", None) or request.headers.get(TENANT_HEADER) or ATTENDEE_ID
+    if tenant_id != ATTENDEE_ID and not TENANT_ID_PATTERN.match(tenant_id):
+        raise HTTPException(status_code=400, detail="Invalid tenant id (1-48 letters, digits, '-' or '_')")
+    return tenant_id
+
+async def resolve_tenant(tenant_id: str) -> Optional[Tenant]:
+    """The tenant's loaded state (None while RAG is still initializing)"""
+    if tenant_id == ATTENDEE_ID or tenant_registry is None:
+        return base_tenant
+    return await tenant_registry.get(tenant_id)
+
+def tenant_manifest_path(name: str) -> Optional[str]:
+    # A shared index is the only record; local manifest files would diverge between workers
+    if not VECTORSTORE_DIR or CHROMA_SERVER_URL:
+        return None
+    return os.path.join(VECTORSTORE_DIR, f"{name}.manifest.json")
+
+def open_tenant_collection(tenant_id: str) -> Chroma:
+    return Chroma(client=chroma_client, collection_name=collection_name(tenant_id), embedding_function=embeddings)
+
+def attach_tenant_collection(tenant: Tenant):
+    """Open the collection of a tenant that had none (vector store and chromadb handle)"""
+    tenant.vectorstore = open_tenant_collection(tenant.tenant_id)
+    tenant.collection = chroma_client.get_collection(collection_name(tenant.tenant_id))
+
+def load_tenant(tenant_id: str) -> Tenant:
+    """Open a tenant's collection, manifest and BM25 index (runs in a worker thread)"""
+    name = collection_name(tenant_id)
+    manifest = IngestManifest(tenant_manifest_path(name))
+    index = BM25Index() if RETRIEVAL_MODE == "hybrid" else None
+    try:
+        collection = chroma_client.get_collection(name)
+        store = open_tenant_collection(tenant_id)
+    except (ChromaError, ValueError):
+        # The tenant has not added any documents yet (older chromadb raises ValueError)
+        collection = store = None
+    if store is not None:
+        stored = store.get(include=["documents", "metadatas"] if index is not None else [])
+        # The collection is the record: a manifest file may be stale and without
+        # VECTORSTORE_DIR there is none, which would leave memory_bytes() at 0
+        manifest.documents = set(stored["ids"])
+        if index is not None:
+            index.rebuild(stored["ids"], stored["documents"], stored["metadatas"])
+    cache = SemanticCache(
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+    )
+    logger.info("Tenant loaded", extra={
+        "tenant_id": tenant_id,
+        "tenant_chunks": len(manifest),
+        "tenants_loaded": len(tenant_registry) + 1
+    })
+    return Tenant(tenant_id, store, manifest, index, cache, collection=collection)
+
+def add_tenant_chunks(tenant: Tenant, chunks: list) -> int:
+    """
+    Embed and insert chunks into a tenant's knowledge base (worker thread).
+    Chunks the base corpus already holds are skipped for other tenants.
+    """
+    if tenant is base_tenant:
+        return add_chunks(vectorstore, ingest_manifest, chunks, lexical_index)
+    if tenant.vectorstore is None:
+        attach_tenant_collection(tenant)
+    return add_chunks(tenant.vectorstore, tenant.manifest, chunks, tenant.lexical_index,
+                      shared_manifest=ingest_manifest)
+
+def documents_added(tenant: Tenant):
+    """Cached answers were generated without the new documents; the tenant may also have outgrown its share"""
+    if tenant is base_tenant:
+        # Every tenant searches the base corpus
+        semantic_cache.invalidate()
+        for loaded in tenant_registry.loaded():
+            loaded.semantic_cache.invalidate()
+    else:
+        tenant.semantic_cache.invalidate()
+        tenant_registry.enforce_limits(keep=tenant.tenant_id)
+
+def refresh_tenant(tenant: Tenant) -> int:
+    """Catch up with documents other workers added to the tenant's shared collection (worker thread)"""
+    if tenant.vectorstore is None:
+        try:
+            chroma_client.get_collection(collection_name(tenant.tenant_id))
+        except (ChromaError, ValueError):
+            return 0
+        attach_tenant_collection(tenant)
+    return refresh_from_store(tenant.vectorstore, tenant.manifest, tenant.lexical_index)
+
+async def refresh_shared_index():
+    """Shared index mode: periodically pick up other workers' writes"""
+    while True:
+        await asyncio.sleep(SHARED_INDEX_REFRESH_SECONDS)
+        if base_tenant is None:
+            continue
+        for tenant in [base_tenant, *tenant_registry.loaded()]:
+            try:
+                async with tenant.write_lock:
+                    changed = await asyncio.to_thread(refresh_tenant, tenant)
+            except Exception as e:
+                logger.warning("Shared index refresh failed", extra={"tenant_id": tenant.tenant_id, "error": str(e)})
+                continue
+            if changed:
+                documents_added(tenant)
+                logger.info("Shared index refreshed", extra={"tenant_id": tenant.tenant_id, "chunks_changed": changed})
+
+def build_context(retrieved_docs: list) -> Optional[str]:
+    """Context for the answer prompt, or None to answer with the lean prompt"""
+    skipped = not retrieved_docs and RETRIEVAL_ADAPTIVE_K
+    set_span_attributes({"rag.context_skipped": skipped})
+    return None if skipped else generate_context(retrieved_docs)
+
 @workflow(name="rag_chat_pipeline")
-def process_rag_chat(message: str) -> tuple:
+async def process_rag_chat(message: str, query_embedding: Optional[List[float]] = None,
+                           tenant: Optional[Tenant] = None, history: Optional[tuple] = None) -> tuple:
     """
     RAG Chat Pipeline - Groups all LLM calls under a single parent trace
+
+    Every stage awaits the async LangChain APIs (ainvoke), so the event loop
+    keeps serving other requests while Azure OpenAI is working. The intent
+    result is only used to route generation (CHAT_ROUTES), so INTENT_SCHEDULING
+    decides whether it sits on the critical path at all.
+
+    Returns (response_text, sources, prompt_tokens).
     """
-    # Step 1: Analyze query intent (generates LLM span)
-    intent_info = analyze_query_intent(message)
+    # Steps 1 + 2: Intent analysis and document retrieval
+    retrieved_docs, intent = await analyze_and_retrieve(message, query_embedding, tenant)
     
-    # Step 2: Retrieve relevant documents (generates embedding + search spans)
-    retrieved_docs = retrieve_documents(message)
-    
-    # Step 3: Generate context from documents
-    context = generate_context(retrieved_docs)
+    # Step 3: Generate context from documents (skipped when nothing relevant was found)
+    context = build_context(retrieved_docs)
     
     # Step 4: Generate response with context (generates LLM span)
-    response_text = generate_response(message, context)
+    response_text = await generate_response(message, context, intent, history)
     
     # Step 5: Summarize sources for response
     sources = summarize_sources(retrieved_docs)
     
-    return response_text, sources
+    return response_text, sources, count_prompt_tokens(build_rag_messages(message, context, history))
 
+@workflow(name="rag_chat_stream_pipeline")
+async def process_rag_chat_stream(message: str, query_embedding: Optional[List[float]] = None,
+                                  tenant: Optional[Tenant] = None, history: Optional[tuple] = None):
+    """
+    Streaming RAG Chat Pipeline - Same spans as process_rag_chat, but yields
+    ("sources", list) and ("prompt_tokens", int) first and then ("token", str)
+    for every LLM token
+    """
+    # Steps 1 + 2: Intent analysis and document retrieval
+    retrieved_docs, intent = await analyze_and_retrieve(message, query_embedding, tenant)
+    
+    # Step 3: Generate context from documents (skipped when nothing relevant was found)
+    context = build_context(retrieved_docs)
+    
+    # Step 4: Sources are known before generation starts, send them up front
+    yield "sources", summarize_sources(retrieved_docs)
+    yield "prompt_tokens", count_prompt_tokens(build_rag_messages(message, context, history))
+    
+    # Step 5: Stream the response with context (generates LLM span)
+    async for token in generate_response_stream(message, context, intent, history):
+        yield "token", token
+
+def set_chat_association_properties(request: ChatRequest):
+    """Attach the user's original question to the trace for visibility in Dynatrace"""
+    # This captures the actual user input separately from the full RAG prompt
+    try:
+        from traceloop.sdk import Traceloop
+        Traceloop.set_association_properties({
+            "user.question": request.message,
+            "use_rag": str(request.use_rag)
+        })
+    except Exception:
+        pass  # Traceloop not initialized, skip
+
+def sse_event(event: str, data: dict) -> str:
+    """Format a server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check - 200 once the knowledge base is indexed, 503 with progress before that"""
+    body = {
+        "status": "ready" if rag_status["state"] == "ready" else "not_ready",
+        "attendee_id": ATTENDEE_ID,
+        **rag_status
+    }
+    return JSONResponse(status_code=200 if body["status"] == "ready" else 503, content=body)
+
+async def resolve_session(request: ChatRequest, tenant_id: str) -> Optional[Session]:
+    """
+    The tenant's session the request continues, a new one for new_session, or
+    None for a stateless request. New ids are generated here and written to
+    request.session_id; ids the server did not hand out are rejected.
+    """
+    if request.session_id is None:
+        if not request.new_session:
+            return None
+        request.session_id = new_session_id()
+        return await session_store.get(f"{tenant_id}/{request.session_id}", create=True)
+    if not SESSION_ID_PATTERN.match(request.session_id):
+        raise HTTPException(status_code=400, detail="Invalid session id")
+    session = await session_store.get(f"{tenant_id}/{request.session_id}")
+    if session is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session, start a new one with new_session")
+    return session
+
+def session_history(session: Optional[Session]) -> Optional[tuple]:
+    """(summary, recent turns) to send with the next prompt; None without history"""
+    if session is None or (not session.summary and not session.turns):
+        return None
+    return session_store.history(session)
+
+async def finish_turn(session: Optional[Session], question: str, answer: str, prompt_tokens: int):
+    """Add an answered turn to its session and fold older turns into the summary in the background"""
+    if session is None:
+        return
+    set_span_attributes({"session.turn": session.turn_count + 1, "session.prompt_tokens": prompt_tokens})
+    if await session_store.record_turn(session, question, answer, prompt_tokens):
+        run_in_background(session_store.fold(session))
+
+async def answer_chat(request: ChatRequest, tenant: Optional[Tenant], session: Optional[Session] = None) -> tuple:
+    """
+    Produce (response_text, sources, prompt_tokens) for a chat request using RAG or direct LLM
+    
+    With a session its history goes into the prompt and the semantic cache is
+    skipped, since the answer depends on the conversation so far.
+    """
+    history = session_history(session)
+    if use_rag_pipeline(request, tenant):
+        if history is None and semantic_cache_active():
+            query_embedding, cached = await lookup_cached_response(request.message, tenant)
+        else:
+            query_embedding, cached = None, None
+        if cached:
+            response_text, sources, prompt_tokens = cached.response, cached.sources, None
+        else:
+            cache_generation = tenant.semantic_cache.generation
+            # Use the workflow-decorated function to group all operations
+            response_text, sources, prompt_tokens = await process_rag_chat(
+                request.message, query_embedding, tenant, history
+            )
+            if query_embedding is not None:
+                tenant.semantic_cache.store(query_embedding, response_text, sources, cache_generation)
+        logger.info("RAG chat response generated", extra={
+            "response_length": len(response_text),
+            "sources_count": len(sources) if sources else 0,
+            "mode": "rag",
+            "cache_hit": cached is not None
+        })
+    else:
+        # Direct LLM call (single LLM span)
+        started = time.perf_counter()
+        messages = build_direct_messages(request.message, history)
+        route = route_generation(request.message, None, None)
+        response = await invoke_chat("generation", messages, LLM_GENERATION_DEADLINE_SECONDS, route)
+        service_metrics.record_stage("generation", "direct", time.perf_counter() - started)
+        response_text = response.content
+        sources = None
+        prompt_tokens = count_prompt_tokens(messages)
+        logger.info("Direct LLM response generated", extra={
+            "response_length": len(response_text),
+            "mode": "direct"
+        })
+    await finish_turn(session, request.message, response_text, prompt_tokens or 0)
+    return response_text, sources, prompt_tokens
+
+async def chat_events(request: ChatRequest, tenant: Optional[Tenant], session: Optional[Session] = None):
+    """Server-sent events for a streaming chat request using RAG or direct LLM"""
+    response_length = 0
+    sources = None
+    prompt_tokens = None
+    response_parts = []
+    history = session_history(session)
+    try:
+        if use_rag_pipeline(request, tenant):
+            if history is None and semantic_cache_active():
+                query_embedding, cached = await lookup_cached_response(request.message, tenant)
+            else:
+                query_embedding, cached = None, None
+            if cached:
+                sources = cached.sources
+                response_length = len(cached.response)
+                yield sse_event("sources", {"sources": sources})
+                yield sse_event("token", {"token": cached.response})
+                response_parts.append(cached.response)
+            else:
+                cache_generation = tenant.semantic_cache.generation
+                async for kind, payload in process_rag_chat_stream(request.message, query_embedding, tenant, history):
+                    if kind == "sources":
+                        sources = payload
+                        yield sse_event("sources", {"sources": sources})
+                    elif kind == "prompt_tokens":
+                        prompt_tokens = payload
+                    else:
+                        response_parts.append(payload)
+                        response_length += len(payload)
+                        yield sse_event("token", {"token": payload})
+                if query_embedding is not None:
+                    tenant.semantic_cache.store(query_embedding, "".join(response_parts), sources, cache_generation)
+            logger.info("RAG chat response generated", extra={
+                "response_length": response_length,
+                "sources_count": len(sources) if sources else 0,
+                "mode": "rag",
+                "cache_hit": cached is not None,
+                "streamed": True
+            })
+        else:
+            # Direct LLM call (single LLM span)
+            started = time.perf_counter()
+            messages = build_direct_messages(request.message, history)
+            prompt_tokens = count_prompt_tokens(messages)
+            route = route_generation(request.message, None, None)
+            async for chunk in stream_chat("generation", messages, LLM_GENERATION_DEADLINE_SECONDS, route):
+                if chunk.content:
+                    response_length += len(chunk.content)
+                    response_parts.append(chunk.content)
+                    yield sse_event("token", {"token": chunk.content})
+            service_metrics.record_stage("generation", "direct", time.perf_counter() - started)
+            logger.info("Direct LLM response generated", extra={
+                "response_length": response_length,
+                "mode": "direct",
+                "streamed": True
+            })
+        
+        await finish_turn(session, request.message, "".join(response_parts), prompt_tokens or 0)
+        yield sse_event("done", {
+            "attendee_id": ATTENDEE_ID,
+            "tenant_id": tenant.tenant_id if tenant else ATTENDEE_ID,
+            "response_length": response_length,
+            "sources_count": len(sources) if sources else 0,
+            "session_id": request.session_id,
+            "prompt_tokens": prompt_tokens
+        })
+        
+    except Exception as e:
+        logger.error("Error processing chat stream request", extra={
+            "error": str(e),
+            "attendee_id": ATTENDEE_ID
+        })
+        yield sse_event("error", {"detail": f"Error processing request: {str(e)}"})
+
+def use_rag_pipeline(request: ChatRequest, tenant: Optional[Tenant]) -> bool:
+    """
+    Whether a request with its resolved tenant runs RAG. The tenant is resolved
+    before this check, possibly while RAG was still initializing (None); such a
+    request is answered directly even if initialization finished meanwhile.
+    """
+    return bool(request.use_rag and retriever and llm and tenant is not None)
+
+def chat_mode(request: ChatRequest) -> str:
+    """Pipeline a chat request will take: "rag" or "direct" (metric attribute)"""
+    return "rag" if request.use_rag and retriever and llm else "direct"
+
+def count_tokens(text: str) -> int:
+    """Token count with the context builder's tokenizer (an estimate before RAG is initialized)"""
+    if context_builder is None:
+        return (len(text) + 3) // 4
+    return context_builder.counter.count(text)
+
+def estimate_chat_tokens(request: ChatRequest) -> int:
+    """
+    LLM tokens a chat request will use, estimated before any LLM call: the
+    prompt (system prompt, a full context budget, session history and the
+    question, plus the intent classification call) and an expected completion
+    """
+    if not prompt_token_counts:
+        prompt_token_counts["rag"] = count_tokens(RAG_SYSTEM_PROMPT) + count_tokens(RAG_USER_PROMPT)
+    question = count_tokens(request.message)
+    tokens = question + LLM_COMPLETION_TOKENS_ESTIMATE
+    if request.use_rag:
+        tokens += prompt_token_counts["rag"] + CONTEXT_TOKEN_BUDGET
+        if INTENT_BACKEND == "llm":
+            tokens += question + 64
+    if request.session_id is not None:
+        tokens += SESSION_HISTORY_TOKEN_BUDGET + SESSION_SUMMARY_TOKEN_BUDGET
+    return tokens
+
+async def admit_chat(request: ChatRequest, tenant_id: str) -> Slot:
+    """
+    Charge the tenant's token budget and wait for a concurrency slot.
+    Rejections are raised as 429 (token budget) or 503 (overload) with Retry-After.
+    """
+    tokens = estimate_chat_tokens(request) if token_budgets is not None else 0
+    try:
+        if token_budgets is not None:
+            token_budgets.charge(tenant_id, tokens)
+        if chat_limiter is None:
+            return Slot(None)
+        try:
+            return await chat_limiter.acquire()
+        except AdmissionRejected:
+            if token_budgets is not None:
+                token_budgets.refund(tenant_id, tokens)
+            raise
+    except AdmissionRejected as e:
+        service_metrics.admission_rejected.add(1, {"reason": e.reason})
+        logger.warning("Chat request rejected", extra={
+            "reason": e.reason,
+            "retry_after": e.retry_after,
+            "tenant_id": tenant_id,
+            "estimated_tokens": tokens
+        })
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Service busy ({e.reason}), retry after {e.retry_after}s",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+@contextmanager
+def track_chat_request(mode: str, streamed: bool, started: float):
+    """Count the request, track it as in flight and record its total latency"""
+    service_metrics.chat_requests.add(1, service_metrics.REQUEST_ATTRIBUTES[(mode, streamed)])
+    service_metrics.chat_inflight.add(1, service_metrics.MODE_ATTRIBUTES[mode])
+    try:
+        yield
+    finally:
+        service_metrics.chat_inflight.add(-1, service_metrics.MODE_ATTRIBUTES[mode])
+        service_metrics.record_stage("total", mode, time.perf_counter() - started)
+
+def record_coalescing(is_leader: bool, followers: int, streamed: bool):
+    """Log and count requests that shared another request's pipeline execution"""
+    set_span_attributes({"chat.coalesced": not is_leader})
+    if not is_leader:
+        service_metrics.chat_coalesced_requests.add(1, {"streamed": streamed})
+    elif followers:
+        logger.info("Chat request coalesced", extra={
+            "coalesced_followers": followers,
+            "streamed": streamed
+        })
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """
     Chat endpoint - Process a message using RAG or direct LLM
     
@@ -590,7 +1848,13 @@ async def chat(request: ChatRequest):
     3. Context generation
     4. Response generation (LLM call)
     5. Source summarization
+    
+    Concurrent identical requests share one pipeline execution (CHAT_COALESCING_ENABLED).
+    The tenant comes from the X-Tenant-ID header or a /tenants/{tenant_id} path prefix.
+    new_session starts a server-side conversation and returns its session_id;
+    sending that session_id continues it (never coalesced).
     """
+    started = time.perf_counter()
     logger.info("Chat request received", extra={
         "message_length": len(request.message),
         "use_rag": request.use_rag,
@@ -602,73 +1866,299 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
     # Add user's original question as a trace attribute for better visibility in Dynatrace
-    # This captures the actual user input separately from the full RAG prompt
+    set_chat_association_properties(request)
+    
+    if request.use_rag:
+        await wait_for_rag()
+    tenant_id = requested_tenant_id(http_request)
+    slot = await admit_chat(request, tenant_id)
+    # Only admitted requests may create sessions
     try:
-        from traceloop.sdk import Traceloop
-        Traceloop.set_association_properties({
-            "user.question": request.message,
-            "use_rag": str(request.use_rag)
-        })
-    except Exception:
-        pass  # Traceloop not initialized, skip
+        session = await resolve_session(request, tenant_id)
+    except HTTPException:
+        slot.release()
+        raise
     
     try:
-        if request.use_rag and retriever and llm:
-            # Use the workflow-decorated function to group all operations
-            response_text, sources = process_rag_chat(request.message)
-            logger.info("RAG chat response generated", extra={
-                "response_length": len(response_text),
-                "sources_count": len(sources) if sources else 0,
-                "mode": "rag"
-            })
-        else:
-            # Direct LLM call (single LLM span)
-            direct_llm = AzureChatOpenAI(
-                azure_endpoint=AZURE_OPENAI_ENDPOINT,
-                api_key=AZURE_OPENAI_API_KEY,
-                azure_deployment=AZURE_OPENAI_CHAT_DEPLOYMENT,
-                api_version=AZURE_OPENAI_API_VERSION,
-                temperature=0.7
-            )
-            response = direct_llm.invoke(request.message)
-            response_text = response.content
-            sources = None
-            logger.info("Direct LLM response generated", extra={
-                "response_length": len(response_text),
-                "mode": "direct"
-            })
+        with track_chat_request(chat_mode(request), streamed=False, started=started):
+            tenant = await resolve_tenant(tenant_id)
+            if CHAT_COALESCING_ENABLED and session is None:
+                key = coalescing_key(request.message, request.use_rag, tenant_id)
+                (response_text, sources, prompt_tokens), is_leader, followers = await chat_flights.do(
+                    key, lambda: answer_chat(request, tenant)
+                )
+                record_coalescing(is_leader, followers, streamed=False)
+            else:
+                response_text, sources, prompt_tokens = await answer_chat(request, tenant, session)
         
         return ChatResponse(
             response=response_text,
             attendee_id=ATTENDEE_ID,
-            sources=sources
+            sources=sources,
+            session_id=request.session_id,
+            prompt_tokens=prompt_tokens
         )
         
+    except CircuitOpenError as e:
+        logger.warning("Chat request failed fast, Azure OpenAI circuit open", extra={"error": str(e)})
+        retry_after = max(1, math.ceil(e.retry_after))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(retry_after)})
+    except DeadlineExceeded as e:
+        logger.error("Chat request missed its LLM deadline", extra={"error": str(e), "stage": e.stage})
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error("Error processing chat request", extra={
             "error": str(e),
             "attendee_id": ATTENDEE_ID
         })
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    finally:
+        slot.release()
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """
+    Streaming chat endpoint - Same pipeline as /chat, sent as server-sent events
+    
+    Events:
+    - sources: {"sources": [...]} (RAG mode only, before the first token)
+    - token:   {"token": "..."} for every generated token
+    - done:    {"attendee_id", "tenant_id", "response_length", "sources_count", "session_id", "prompt_tokens"}
+    - error:   {"detail": "..."} if generation fails mid-stream
+    
+    Concurrent identical requests share one stream; late joiners replay it from the start.
+    """
+    started = time.perf_counter()
+    logger.info("Chat stream request received", extra={
+        "message_length": len(request.message),
+        "use_rag": request.use_rag,
+        "attendee_id": ATTENDEE_ID
+    })
+    
+    if not request.message.strip():
+        logger.warning("Empty message rejected")
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    
+    set_chat_association_properties(request)
+    
+    if request.use_rag:
+        await wait_for_rag()
+    tenant_id = requested_tenant_id(http_request)
+    slot = await admit_chat(request, tenant_id)
+    try:
+        session = await resolve_session(request, tenant_id)
+    except HTTPException:
+        slot.release()
+        raise
+    try:
+        tenant = await resolve_tenant(tenant_id)
+    except Exception as e:
+        slot.release()
+        raise HTTPException(status_code=500, detail=f"Error loading tenant: {str(e)}")
+    
+    mode = chat_mode(request)
+    if not CHAT_COALESCING_ENABLED or session is not None:
+        events, flight = chat_events(request, tenant, session), None
+    else:
+        key = coalescing_key(request.message, request.use_rag, tenant_id)
+        events, is_leader, flight = stream_flights.stream(key, lambda: chat_events(request, tenant))
+    
+    async def event_stream():
+        try:
+            with track_chat_request(mode, streamed=True, started=started):
+                async for event in events:
+                    yield event
+        finally:
+            slot.release()
+        if flight is not None:
+            record_coalescing(is_leader, flight.followers, streamed=True)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str, http_request: Request):
+    """A conversation session of the requesting tenant: summary, recent turns and per-turn prompt tokens"""
+    session = await session_store.get(f"{requested_tenant_id(http_request)}/{session_id}")
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {
+        "session_id": session_id,
+        "summary": session.summary,
+        "recent_turns": [{"question": question, "answer": answer} for question, answer in session.turns],
+        "turn_count": session.turn_count,
+        "folded_turns": session.folded_turns,
+        "prompt_tokens": session.prompt_tokens
+    }
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str, http_request: Request):
+    """End a conversation session of the requesting tenant"""
+    if not await session_store.delete(f"{requested_tenant_id(http_request)}/{session_id}"):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"status": "deleted", "session_id": session_id}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request rate, in-flight requests and per-stage latency in Prometheus text format"""
+    if not service_metrics.PROMETHEUS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Install opentelemetry-exporter-prometheus to enable /metrics")
+    return Response(content=service_metrics.prometheus_exposition(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/documents")
-async def add_document(request: DocumentRequest):
-    """Add a document to the knowledge base"""
+async def add_document(request: DocumentRequest, http_request: Request):
+    """Add a document to the knowledge base of the requesting tenant"""
     if not vectorstore:
         raise HTTPException(status_code=503, detail="Vector store not initialized")
+    tenant_id = requested_tenant_id(http_request)
     
     try:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
-        )
+        tenant = await resolve_tenant(tenant_id)
         docs = text_splitter.create_documents([request.content])
-        vectorstore.add_documents(docs)
+        # Embedding + insert run in a worker thread so chat traffic is not stalled
+        async with tenant.write_lock:
+            chunks_added = await asyncio.to_thread(add_tenant_chunks, tenant, docs)
+        if chunks_added:
+            documents_added(tenant)
         
-        return {"status": "success", "message": "Document added successfully"}
+        return {"status": "success", "message": "Document added successfully", "chunks_added": chunks_added,
+                "tenant_id": tenant_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding document: {str(e)}")
 
+def get_split_executor():
+    """Process pool for chunk splitting (None = default thread pool when workers are disabled)"""
+    global split_pool
+    if INGEST_SPLIT_WORKERS > 0 and split_pool is None:
+        # spawn: forking a process that is running an event loop and threads is unsafe
+        split_pool = ProcessPoolExecutor(
+            max_workers=INGEST_SPLIT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return split_pool
+
+@app.post("/documents/batch")
+async def add_documents_batch(request: Request):
+    """
+    Bulk-add documents to the knowledge base
+    
+    The body is NDJSON or a JSON array of {"content": ..., "metadata": {...}} objects
+    and is parsed while it streams in. Documents are split in worker processes,
+    new chunks are embedded in batches of INGEST_EMBED_BATCH_SIZE with at most
+    INGEST_EMBED_CONCURRENCY embedding calls in flight, and each batch is
+    inserted into the vector store in bulk. Documents go to the requesting tenant.
+    """
+    if not vectorstore:
+        raise HTTPException(status_code=503, detail="Vector store not initialized")
+    tenant_id = requested_tenant_id(request)
+    try:
+        tenant = await resolve_tenant(tenant_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading tenant: {str(e)}")
+    
+    loop = asyncio.get_running_loop()
+    executor = get_split_executor()
+    embed_slots = asyncio.Semaphore(INGEST_EMBED_CONCURRENCY)
+    started = time.perf_counter()
+    stats = {"documents_received": 0, "chunks_total": 0, "chunks_added": 0, "chunks_skipped": 0}
+    batches = []
+    split_jobs = []
+    batch_tasks = []
+    pending_chunks = []
+    seen_ids = set()
+    
+    async def ingest_batch(batch_number: int, chunks: list):
+        async with embed_slots:
+            embed_started = time.perf_counter()
+            # Embeddings land in the embedding cache, so the bulk insert below
+            # reuses them instead of calling Azure OpenAI a second time
+            await embeddings.aembed_documents([chunk.page_content for chunk in chunks])
+            embed_seconds = time.perf_counter() - embed_started
+        async with tenant.write_lock:
+            added = await asyncio.to_thread(add_tenant_chunks, tenant, chunks)
+        stats["chunks_added"] += added
+        elapsed = time.perf_counter() - started
+        batch_info = {
+            "batch": batch_number,
+            "chunks": len(chunks),
+            "embed_seconds": round(embed_seconds, 3),
+            "chunks_per_second": round(stats["chunks_added"] / elapsed, 1) if elapsed else 0.0
+        }
+        batches.append(batch_info)
+        logger.info("Document batch ingested", extra={**batch_info, "chunks_added_total": stats["chunks_added"]})
+    
+    async def flush_chunks(final: bool = False):
+        while len(pending_chunks) >= INGEST_EMBED_BATCH_SIZE or (final and pending_chunks):
+            batch = pending_chunks[:INGEST_EMBED_BATCH_SIZE]
+            del pending_chunks[:INGEST_EMBED_BATCH_SIZE]
+            batch_tasks.append(asyncio.create_task(ingest_batch(len(batch_tasks) + 1, batch)))
+            # Backpressure: keep a bounded number of batches waiting for an embedding slot
+            while sum(1 for t in batch_tasks if not t.done()) > 2 * INGEST_EMBED_CONCURRENCY:
+                await asyncio.wait([t for t in batch_tasks if not t.done()], return_when=asyncio.FIRST_COMPLETED)
+    
+    async def collect_split(job):
+        for text, metadata in await job:
+            stats["chunks_total"] += 1
+            chunk_hash = chunk_id(text)
+            if chunk_hash in ingest_manifest or chunk_hash in tenant.manifest or chunk_hash in seen_ids:
+                stats["chunks_skipped"] += 1
+                continue
+            seen_ids.add(chunk_hash)
+            pending_chunks.append(Document(page_content=text, metadata=metadata))
+        await flush_chunks()
+    
+    try:
+        group = []
+        async for item in iter_json_objects(request.stream()):
+            document = DocumentRequest(**item)
+            stats["documents_received"] += 1
+            group.append((document.content, document.metadata))
+            if len(group) >= INGEST_SPLIT_GROUP_SIZE:
+                split_jobs.append(loop.run_in_executor(executor, split_documents, group))
+                group = []
+            # Consume finished splits in order while the body is still streaming in
+            while split_jobs and (split_jobs[0].done() or len(split_jobs) > 2 * max(INGEST_SPLIT_WORKERS, 1)):
+                await collect_split(split_jobs.pop(0))
+        if group:
+            split_jobs.append(loop.run_in_executor(executor, split_documents, group))
+        while split_jobs:
+            await collect_split(split_jobs.pop(0))
+        await flush_chunks(final=True)
+        await asyncio.gather(*batch_tasks)
+    except (ValueError, TypeError) as e:
+        # Malformed body: finish what was already scheduled, then report
+        for job in split_jobs:
+            job.cancel()
+        await asyncio.gather(*batch_tasks, return_exceptions=True)
+        raise HTTPException(status_code=400, detail=f"Invalid document batch after {stats['documents_received']} documents: {str(e)}")
+    except Exception as e:
+        for job in split_jobs:
+            job.cancel()
+        await asyncio.gather(*batch_tasks, return_exceptions=True)
+        raise HTTPException(status_code=500, detail=f"Error adding documents: {str(e)}")
+    finally:
+        if stats["chunks_added"]:
+            documents_added(tenant)
+    
+    elapsed = time.perf_counter() - started
+    logger.info("Document batch ingestion completed", extra={
+        **stats,
+        "tenant_id": tenant_id,
+        "batches": len(batches),
+        "elapsed_seconds": round(elapsed, 3)
+    })
+    return {
+        "status": "success",
+        "tenant_id": tenant_id,
+        **stats,
+        "batches": sorted(batches, key=lambda b: b["batch"]),
+        "elapsed_seconds": round(elapsed, 3),
+        "chunks_per_second": round(stats["chunks_added"] / elapsed, 1) if elapsed else 0.0
+    }
+
 @app.get("/info")
 async def get_info():
     """Get detailed service information"""
@@ -676,12 +2166,57 @@ async def get_info():
         "service_name": f"ai-chat-service-{ATTENDEE_ID}",
         "attendee_id": ATTENDEE_ID,
         "rag_initialized": qa_chain is not None,
+        "rag_status": rag_status,
+        "intent_scheduling": INTENT_SCHEDULING,
+        "intent_backend": INTENT_BACKEND,
+        "coalescing": {
+            "enabled": CHAT_COALESCING_ENABLED,
+            "chat": chat_flights.stats(),
+            "stream": stream_flights.stats()
+        },
+        "semantic_cache": {"enabled": SEMANTIC_CACHE_ENABLED, **semantic_cache.stats()},
+        "embedding_cache": embeddings.stats() if embeddings else None,
+        "embedding_batcher": query_batcher.stats() if query_batcher else None,
+        "admission": {
+            "concurrency": chat_limiter.stats() if chat_limiter else None,
+            "token_budget": token_budgets.stats() if token_budgets else None
+        },
+        "shared_index": {
+            "enabled": bool(CHROMA_SERVER_URL),
+            "refresh_seconds": SHARED_INDEX_REFRESH_SECONDS,
+            "workers": APP_WORKERS
+        },
+        "retrieval": {
+            "mode": RETRIEVAL_MODE,
+            "lexical_fast_path": LEXICAL_FAST_PATH_ENABLED,
+            "lexical_chunks": len(lexical_index) if lexical_index is not None else 0
+        },
+        "tenants": {
+            "header": TENANT_HEADER,
+            "path_prefix": "/tenants/{tenant_id}",
+            **(tenant_registry.stats() if tenant_registry else {})
+        },
+        "llm_resilience": {
+            "enabled": LLM_RESILIENCE_ENABLED,
+            "chat_deployments": chat_deployments,
+            "hedging": LLM_HEDGE_ENABLED,
+            **(resilient_caller.stats() if resilient_caller else {})
+        },
+        "model_routing": model_router.stats() if model_router else None,
+        "sessions": session_store.stats(),
+        "http_pool": clients.stats(),
         "documents_loaded": len(SAMPLE_DOCUMENTS),
         "endpoints": [
             {"path": "/", "method": "GET", "description": "Service info"},
             {"path": "/health", "method": "GET", "description": "Health check"},
+            {"path": "/ready", "method": "GET", "description": "Readiness check with indexing progress"},
             {"path": "/chat", "method": "POST", "description": "Chat with AI"},
+            {"path": "/chat/stream", "method": "POST", "description": "Chat with AI (server-sent events)"},
             {"path": "/documents", "method": "POST", "description": "Add documents"},
+            {"path": "/documents/batch", "method": "POST", "description": "Bulk-add documents (NDJSON or JSON array)"},
+            {"path": "/sessions/{session_id}", "method": "GET", "description": "Conversation session history"},
+            {"path": "/sessions/{session_id}", "method": "DELETE", "description": "End a conversation session"},
+            {"path": "/metrics", "method": "GET", "description": "Prometheus metrics"},
         ]
     }
 
@@ -696,5 +2231,6 @@ if __name__ == "__main__":
         "main:app",
         host=APP_HOST,
         port=APP_PORT,
-        reload=True
+        reload=APP_WORKERS == 1,
+        workers=APP_WORKERS
     )
@@ -0,0 +1,162 @@
+"""
+Model Routing
+=============
+Picks the chat deployment for every LLM call from a configured list instead
+of sending everything to one deployment:
+
+- Tier: each deployment is "small" (cheap, fast) or "large". Intent
+  classification always goes to the small tier; an answer goes to the large
+  tier when its classified intent is one of large_intents or its prompt is
+  longer than small_max_prompt_tokens, else to the small tier
+- Latency: deployments of a tier are ordered by the moving average latency
+  of their recent calls, to the first chunk for streams (deployments without
+  calls yet come first)
+- Failover: a saturated deployment (max_inflight calls running) or one the
+  is_available check rejects (e.g. an open circuit breaker) moves to the end,
+  after the other tier
+
+A decision is the full ordered deployment list, so callers can fail over
+along it, the reason it was made and the deployment a slow call may be
+hedged on: the next usable one in the first choice's tier, never another
+tier, so hedges do not turn small-model calls into large-model calls.
+"""
+
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+TIERS = ("small", "large")
+
+
+class Route(NamedTuple):
+    deployment: str
+    tier: str
+    max_inflight: int = 0  # 0 = unlimited
+
+
+class RoutingDecision(NamedTuple):
+    deployments: List[str]
+    tier: str
+    reason: str
+    hedge_to: Optional[str] = None
+
+
+def parse_routes(spec: str) -> List[Route]:
+    """
+    Parse "deployment:tier[:max_inflight],..." e.g. "gpt-4o-mini:small:64,gpt-4o:large:16"
+    """
+    routes = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        fields = entry.split(":")
+        if len(fields) not in (2, 3) or fields[1] not in TIERS:
+            raise ValueError(f"Invalid chat route {entry!r}, expected deployment:small|large[:max_inflight]")
+        routes.append(Route(fields[0], fields[1], int(fields[2]) if len(fields) == 3 else 0))
+    return routes
+
+
+def normalize_intent(intent: Optional[str]) -> Optional[str]:
+    # LLM-classified intents may come back quoted or with a trailing period
+    return intent.strip(" .'\"").lower() if intent else None
+
+
+class ModelRouter:
+    """Tier, latency and saturation aware choice of chat deployment"""
+
+    def __init__(self, routes: Sequence[Route], large_intents: Sequence[str] = ("troubleshooting",),
+                 small_max_prompt_tokens: int = 2000, is_available: Optional[Callable[[str], bool]] = None):
+        if not routes:
+            raise ValueError("ModelRouter needs at least one route")
+        self.routes = list(routes)
+        self.large_intents = {normalize_intent(intent) for intent in large_intents}
+        self.small_max_prompt_tokens = small_max_prompt_tokens
+        self.is_available = is_available
+        self.inflight: Dict[str, int] = {route.deployment: 0 for route in self.routes}
+        self.latency: Dict[str, Optional[float]] = {route.deployment: None for route in self.routes}
+        self.decisions: Dict[str, int] = {}
+        self.failovers = 0
+
+    def _tier(self, stage: str, intent: Optional[str], prompt_tokens: int) -> tuple:
+        if stage == "intent":
+            return "small", "stage=intent"
+        intent = normalize_intent(intent)
+        if intent in self.large_intents:
+            return "large", f"intent={intent}"
+        if prompt_tokens > self.small_max_prompt_tokens:
+            return "large", f"prompt_tokens={prompt_tokens}>{self.small_max_prompt_tokens}"
+        return "small", f"intent={intent or 'unknown'},prompt_tokens={prompt_tokens}"
+
+    def _unavailable(self, route: Route) -> Optional[str]:
+        if route.max_inflight and self.inflight[route.deployment] >= route.max_inflight:
+            return "saturated"
+        if self.is_available is not None and not self.is_available(route.deployment):
+            return "unavailable"
+        return None
+
+    def route(self, stage: str, intent: Optional[str] = None, prompt_tokens: int = 0) -> RoutingDecision:
+        """Ordered deployments for one call and the reason for the first choice"""
+        tier, reason = self._tier(stage, intent, prompt_tokens)
+        if not any(route.tier == tier for route in self.routes):
+            other = "large" if tier == "small" else "small"
+            tier, reason = other, f"{reason},no_{tier}_deployment"
+
+        def preference(route: Route) -> tuple:
+            # Unmeasured deployments sort first so every deployment gets measured
+            return route.tier != tier, self.latency[route.deployment] or 0.0
+
+        ordered = sorted(self.routes, key=preference)
+        usable = [route for route in ordered if self._unavailable(route) is None]
+        blocked = [route for route in ordered if self._unavailable(route) is not None]
+        if blocked and blocked[0] is ordered[0]:
+            self.failovers += 1
+            reason = f"{reason},failover={ordered[0].deployment}:{self._unavailable(ordered[0])}"
+        deployments = [route.deployment for route in usable + blocked]
+        first = (usable + blocked)[0]
+        hedge_to = next((route.deployment for route in usable[1:] if route.tier == first.tier), None)
+        self.decisions[deployments[0]] = self.decisions.get(deployments[0], 0) + 1
+        return RoutingDecision(deployments, tier, reason, hedge_to if first in usable else None)
+
+    def _observe(self, deployment: str, seconds: float):
+        previous = self.latency[deployment]
+        self.latency[deployment] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    async def run(self, deployment: str, call: Callable[[], Awaitable]):
+        """Await call() on deployment, counted as in flight and timed"""
+        started = time.monotonic()
+        self.inflight[deployment] += 1
+        try:
+            result = await call()
+            self._observe(deployment, time.monotonic() - started)
+            return result
+        finally:
+            self.inflight[deployment] -= 1
+
+    async def stream(self, deployment: str, iterator: AsyncIterator) -> AsyncIterator:
+        """Pass iterator through, counted as in flight until it ends and timed to the first chunk"""
+        started = time.monotonic()
+        self.inflight[deployment] += 1
+        first = True
+        try:
+            async for chunk in iterator:
+                if first:
+                    first = False
+                    self._observe(deployment, time.monotonic() - started)
+                yield chunk
+        finally:
+            self.inflight[deployment] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "large_intents": sorted(self.large_intents),
+            "small_max_prompt_tokens": self.small_max_prompt_tokens,
+            "failovers": self.failovers,
+            "deployments": {
+                route.deployment: {
+                    "tier": route.tier,
+                    "max_inflight": route.max_inflight,
+                    "inflight": self.inflight[route.deployment],
+                    "latency_seconds": None if self.latency[route.deployment] is None
+                    else round(self.latency[route.deployment], 3),
+                    "decisions": self.decisions.get(route.deployment, 0),
+                }
+                for route in self.routes
+            },
+        }
@@ -0,0 +1,367 @@
+"""
+Resilient Azure OpenAI Calls
+============================
+Wraps chat and embedding calls so one slow or failing deployment cannot set
+the service's tail latency:
+
+- Deadlines: every call of a stage (intent, generation, embedding) must
+  finish within that stage's deadline, retries included
+- Retries: retryable failures (429, 5xx, timeouts, connection errors) are
+  retried with full-jitter exponential backoff, but only while a global
+  retry budget allows, so retries cannot multiply load during an outage
+- Circuit breakers: a deployment that failed failure_threshold times in a
+  row is skipped for reset_timeout seconds; afterwards a single trial call
+  is let through (others are still rejected) and its result closes or
+  re-opens the breaker
+- Hedging: when the caller names a hedge deployment, a call still running
+  after the primary deployment's latency percentile for that stage is also
+  sent there, and the first answer wins
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import openai
+from langchain_core.embeddings import Embeddings
+
+from admission import TokenBucket
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class CircuitOpenError(Exception):
+    """Every deployment for the call has an open circuit breaker"""
+
+    def __init__(self, deployments: Sequence[str], retry_after: float):
+        super().__init__(f"Circuit open for {', '.join(deployments)}")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """A stage did not finish within its deadline, retries included"""
+
+    def __init__(self, stage: str, deadline: float):
+        super().__init__(f"{stage} did not finish within {deadline:g}s")
+        self.stage = stage
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half open -> closed"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.opened = 0
+        # The one call let through while half open is in flight
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.retry_after() == 0 else "open"
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call would be let through now (no side effects, see acquire)"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self.trial)
+
+    def acquire(self) -> Optional[bool]:
+        """
+        Claim a call: None when it is rejected, else whether it is the half-open
+        trial, which has to end in record_success, record_failure or release
+        """
+        if not self.allow():
+            return None
+        if self.opened_at is None:
+            return False
+        self.trial = True
+        return True
+
+    def release(self):
+        """End a trial that said nothing about the deployment's health (bad request, cancelled)"""
+        self.trial = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self):
+        self.failures += 1
+        # A failure while half open re-opens the breaker right away
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.opened += 1
+        self.trial = False
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful calls"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class ResilientCaller:
+    """Deadlines, budgeted retries, per-deployment circuit breakers and hedging"""
+
+    def __init__(self, max_retries: int = 2, retry_budget_ratio: float = 0.1,
+                 retry_min_per_second: float = 1.0, base_backoff: float = 0.2, max_backoff: float = 2.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 hedge_percentile: float = 95, hedge_min_delay: float = 0.1,
+                 on_event: Optional[Callable[[str, str], None]] = None):
+        self.max_retries = max_retries
+        self.retry_budget_ratio = retry_budget_ratio
+        # Every call deposits retry_budget_ratio, every retry takes one token; the
+        # bucket also refills at retry_min_per_second so low traffic can still retry
+        self.retry_budget = TokenBucket(rate=retry_min_per_second, capacity=max(10.0, 10 * retry_min_per_second))
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.on_event = on_event
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[tuple, LatencyWindow] = {}
+        self.counts: Dict[str, int] = {}
+
+    def _event(self, event: str, stage: str):
+        self.counts[event] = self.counts.get(event, 0) + 1
+        if self.on_event:
+            self.on_event(event, stage)
+
+    def breaker(self, deployment: str) -> CircuitBreaker:
+        if deployment not in self.breakers:
+            self.breakers[deployment] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self.breakers[deployment]
+
+    def hedge_delay(self, stage: str, deployment: str) -> Optional[float]:
+        window = self.latencies.get((stage, deployment))
+        latency = window.percentile(self.hedge_percentile) if window else None
+        return None if latency is None else max(self.hedge_min_delay, latency)
+
+    def _available(self, deployments: Sequence[str]) -> List[str]:
+        available = [deployment for deployment in deployments if self.breaker(deployment).allow()]
+        if not available:
+            self._event("circuit_open", "any")
+            raise CircuitOpenError(deployments, min(self.breaker(d).retry_after() for d in deployments))
+        return available
+
+    def _backoff(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** retry))
+
+    def _may_retry(self, error: BaseException, retry: int, stage: str) -> bool:
+        if not is_retryable(error) or retry >= self.max_retries:
+            return False
+        if self.retry_budget.take(1):
+            self._event("retry_budget_exhausted", stage)
+            return False
+        self._event("retry", stage)
+        return True
+
+    async def call(self, stage: str, deployments: Sequence[str], attempt: Callable[[str], Awaitable[Any]],
+                   deadline: float, hedge_to: Optional[str] = None) -> Any:
+        """
+        Run attempt(deployment) on the first deployment whose breaker allows it,
+        hedged on hedge_to (when given and its breaker allows it), retried within
+        deadline seconds
+        """
+        self.retry_budget.give(self.retry_budget_ratio)
+        # Deployments with an attempt still running; finished attempts already
+        # recorded their own result
+        inflight = set()
+        try:
+            return await asyncio.wait_for(self._call(stage, deployments, attempt, hedge_to, inflight), deadline)
+        except asyncio.TimeoutError:
+            self._event("deadline_exceeded", stage)
+            for deployment in inflight:
+                self.breaker(deployment).record_failure()
+            raise DeadlineExceeded(stage, deadline)
+
+    async def _call(self, stage: str, deployments: Sequence[str], attempt: Callable[[str], Awaitable[Any]],
+                    hedge_to: Optional[str], inflight: set) -> Any:
+        retry = 0
+        while True:
+            try:
+                available = self._available(deployments)
+                if hedge_to is not None and hedge_to != available[0] and self.breaker(hedge_to).allow():
+                    return await self._hedged(stage, available[0], hedge_to, attempt, inflight)
+                return await self._attempt(stage, available[0], attempt, inflight)
+            except Exception as e:
+                if not self._may_retry(e, retry, stage):
+                    raise
+                retry += 1
+                await asyncio.sleep(self._backoff(retry))
+
+    async def _attempt(self, stage: str, deployment: str, attempt: Callable[[str], Awaitable[Any]],
+                       inflight: set) -> Any:
+        breaker = self.breaker(deployment)
+        trial = breaker.acquire()
+        if trial is None:
+            raise CircuitOpenError([deployment], breaker.retry_after())
+        started = time.monotonic()
+        # Left in inflight when cancelled, so a missed deadline is charged to it
+        inflight.add(deployment)
+        try:
+            result = await attempt(deployment)
+        except Exception as e:
+            inflight.discard(deployment)
+            # Bad requests say nothing about the deployment's health
+            if is_retryable(e):
+                breaker.record_failure()
+            raise
+        finally:
+            if trial:
+                breaker.release()
+        inflight.discard(deployment)
+        breaker.record_success()
+        self.latencies.setdefault((stage, deployment), LatencyWindow()).add(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, stage: str, deployment: str, hedge_to: str,
+                      attempt: Callable[[str], Awaitable[Any]], inflight: set) -> Any:
+        delay = self.hedge_delay(stage, deployment)
+        if delay is None:
+            # No latency history yet, so no basis for a hedge
+            return await self._attempt(stage, deployment, attempt, inflight)
+        primary = asyncio.ensure_future(self._attempt(stage, deployment, attempt, inflight))
+        pending = {primary}
+        error = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done:
+                return primary.result()
+
+            self._event("hedge", stage)
+            backup = asyncio.ensure_future(self._attempt(stage, hedge_to, attempt, inflight))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._event("hedge_won", stage)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, stage: str, deployments: Sequence[str], start: Callable[[str], AsyncIterator],
+                     first_chunk_deadline: float) -> AsyncIterator:
+        """
+        Stream start(deployment). The first chunk is fetched like a call (deadline,
+        retries, breakers, no hedging); the rest of the stream is passed through.
+        """
+        async def first_chunk(deployment: str):
+            iterator = start(deployment).__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return None, None
+
+        iterator, chunk = await self.call(stage, deployments, first_chunk, first_chunk_deadline)
+        if iterator is None:
+            return
+        yield chunk
+        async for chunk in iterator:
+            yield chunk
+
+    def stats(self) -> dict:
+        return {
+            "retry_budget_tokens": round(self.retry_budget.tokens, 2),
+            "events": dict(self.counts),
+            "breakers": {
+                deployment: {"state": breaker.state, "failures": breaker.failures, "opened": breaker.opened}
+                for deployment, breaker in self.breakers.items()
+            },
+            "hedge_delays": {
+                f"{stage}/{deployment}": self.hedge_delay(stage, deployment)
+                for stage, deployment in self.latencies
+            },
+        }
+
+
+class ResilientEmbeddings(Embeddings):
+    """
+    Embeddings whose async calls go through a ResilientCaller (never hedged:
+    vectors from different deployments are not comparable). Sync calls get the
+    breaker and budgeted retries; the client's own timeout bounds each attempt.
+    """
+
+    def __init__(self, underlying: Embeddings, caller: ResilientCaller, deployment: str, deadline: float):
+        self.underlying = underlying
+        self.caller = caller
+        self.deployment = deployment
+        self.deadline = deadline
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.caller.call(
+            "embedding", [self.deployment], lambda _: self.underlying.aembed_documents(texts), self.deadline
+        )
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.caller.call(
+            "embedding", [self.deployment], lambda _: self.underlying.aembed_query(text), self.deadline
+        )
+
+    def _call_sync(self, fn: Callable[[], Any]) -> Any:
+        breaker = self.caller.breaker(self.deployment)
+        self.caller.retry_budget.give(self.caller.retry_budget_ratio)
+        retry = 0
+        while True:
+            trial = breaker.acquire()
+            if trial is None:
+                raise CircuitOpenError([self.deployment], breaker.retry_after())
+            try:
+                result = fn()
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                if trial:
+                    breaker.release()
+                if not self.caller._may_retry(e, retry, "embedding"):
+                    raise
+                retry += 1
+                time.sleep(self.caller._backoff(retry))
+                continue
+            breaker.record_success()
+            return result
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._call_sync(lambda: self.underlying.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call_sync(lambda: self.underlying.embed_query(text))
@@ -0,0 +1,124 @@
+"""
+Semantic Response Cache
+=======================
+Caches RAG answers keyed by the query embedding, so a question that is
+*almost* the same as one answered recently (cosine similarity above a
+threshold) is served without any LLM calls.
+
+Entries expire after a TTL and the cache is size-bounded with LRU eviction.
+Every cached answer belongs to a knowledge-base "generation"; invalidate()
+starts a new generation so answers computed against the old documents are
+neither served nor stored.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class CacheEntry:
+    """A cached RAG answer"""
+    response: str
+    sources: Optional[List[str]]
+    created_at: float = field(default_factory=time.monotonic)
+    hits: int = 0
+
+
+class SemanticCache:
+    """Size-bounded, TTL-aware response cache with embedding-similarity lookup"""
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 3600, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        # key -> (unit-normalized embedding, entry), ordered from least to most recently used
+        self._entries: "OrderedDict[int, Tuple[np.ndarray, CacheEntry]]" = OrderedDict()
+        self._next_key = 0
+        # Stacked embeddings for vectorized lookup, rebuilt lazily after changes
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, key: int):
+        del self._entries[key]
+        self._matrix = None
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [key for key, (_, entry) in self._entries.items()
+                   if now - entry.created_at > self.ttl_seconds]
+        for key in expired:
+            self._remove(key)
+
+    def lookup(self, embedding) -> Tuple[Optional[CacheEntry], float]:
+        """
+        Find the most similar cached answer.
+        Returns (entry, similarity); entry is None when the best match is below the threshold.
+        """
+        self._evict_expired()
+        if not self._entries:
+            self.misses += 1
+            return None, 0.0
+
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries.keys())
+            self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+
+        similarities = self._matrix @ self._normalize(embedding)
+        best = int(np.argmax(similarities))
+        similarity = float(similarities[best])
+        if similarity < self.threshold:
+            self.misses += 1
+            return None, similarity
+
+        key = self._matrix_keys[best]
+        self._entries.move_to_end(key)
+        entry = self._entries[key][1]
+        entry.hits += 1
+        self.hits += 1
+        return entry, similarity
+
+    def store(self, embedding, response: str, sources: Optional[List[str]], generation: int):
+        """Cache an answer computed against the given knowledge-base generation"""
+        if generation != self.generation:
+            return  # Knowledge base changed while the answer was being generated
+        self._entries[self._next_key] = (self._normalize(embedding), CacheEntry(response, sources))
+        self._next_key += 1
+        self._matrix = None
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self):
+        """Drop every entry, e.g. after the knowledge base changed"""
+        self._entries.clear()
+        self._matrix = None
+        self.generation += 1
+
+    def stats(self) -> dict:
+        """Cache statistics for /info and logs"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "generation": self.generation,
+        }
@@ -0,0 +1,182 @@
+"""
+Service Metrics
+===============
+OpenTelemetry instruments recorded by the chat service.
+
+The service keeps its own MeterProvider, independent of the global one that
+Traceloop installs in Lab 1, so the metrics work with or without
+instrumentation:
+
+- /metrics serves them in Prometheus text format (needs the optional
+  opentelemetry-exporter-prometheus package)
+- with DT_ENDPOINT and DT_API_TOKEN set they are also pushed over OTLP with
+  delta temporality, which is what Dynatrace ingests
+
+Recording is an in-memory aggregation (no I/O on the request path); the
+attribute sets used on the chat hot path are built once and reused.
+"""
+
+import os
+
+from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+from opentelemetry.sdk.metrics import Counter, Histogram, MeterProvider, ObservableCounter, UpDownCounter
+from opentelemetry.sdk.metrics.export import AggregationTemporality, PeriodicExportingMetricReader
+from opentelemetry.sdk.resources import Resource
+
+try:
+    from opentelemetry.exporter.prometheus import PrometheusMetricReader
+    from prometheus_client import CollectorRegistry, generate_latest
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+DT_ENDPOINT = os.getenv("DT_ENDPOINT")
+DT_API_TOKEN = os.getenv("DT_API_TOKEN")
+METRICS_EXPORT_INTERVAL_SECONDS = float(os.getenv("METRICS_EXPORT_INTERVAL_SECONDS", 60))
+
+# Same service.name as the OTLP logs, so metrics, logs and traces land on one service
+resource = Resource.create({
+    "service.name": f"ai-chat-service-{os.getenv('ATTENDEE_ID', 'workshop-attendee')}"
+})
+
+readers = []
+prometheus_registry = None
+if PROMETHEUS_AVAILABLE:
+    prometheus_registry = CollectorRegistry(auto_describe=True)
+    readers.append(PrometheusMetricReader(registry=prometheus_registry))
+OTLP_EXPORT_ENABLED = bool(DT_ENDPOINT and DT_API_TOKEN)
+if OTLP_EXPORT_ENABLED:
+    readers.append(PeriodicExportingMetricReader(
+        OTLPMetricExporter(
+            endpoint=f"{DT_ENDPOINT}/v1/metrics",
+            headers={"Authorization": f"Api-Token {DT_API_TOKEN}"},
+            preferred_temporality={
+                Counter: AggregationTemporality.DELTA,
+                Histogram: AggregationTemporality.DELTA,
+                ObservableCounter: AggregationTemporality.DELTA,
+                UpDownCounter: AggregationTemporality.CUMULATIVE,
+            }
+        ),
+        export_interval_millis=METRICS_EXPORT_INTERVAL_SECONDS * 1000
+    ))
+
+meter_provider = MeterProvider(resource=resource, metric_readers=readers)
+meter = meter_provider.get_meter("ai-chat-service")
+
+# Latency buckets in seconds, from sub-millisecond steps to slow LLM calls
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+# Azure OpenAI prompt caching: cached / input tokens is the prefix cache hit rate
+llm_input_tokens = meter.create_counter(
+    "llm.prompt.input_tokens",
+    unit="{token}",
+    description="Prompt tokens sent to the chat model"
+)
+llm_cached_tokens = meter.create_counter(
+    "llm.prompt.cached_tokens",
+    unit="{token}",
+    description="Prompt tokens served from the Azure OpenAI prompt cache"
+)
+llm_generation_duration = meter.create_histogram(
+    "llm.generation.duration",
+    unit="s",
+    description="Answer generation latency, split by prompt cache hit",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS
+)
+
+# Chat requests answered by another identical in-flight request (single-flight)
+chat_coalesced_requests = meter.create_counter(
+    "chat.coalesced_requests",
+    unit="{request}",
+    description="Chat requests that shared another request's pipeline execution"
+)
+
+# Query embedding micro-batching: texts per embedding call and time spent queued
+embedding_batch_size = meter.create_histogram(
+    "embedding.batch.size",
+    unit="{text}",
+    description="Distinct query texts sent in one batched embedding call",
+    explicit_bucket_boundaries_advisory=[1, 2, 4, 8, 16, 32, 64, 128]
+)
+embedding_queue_wait = meter.create_histogram(
+    "embedding.batch.queue_wait",
+    unit="s",
+    description="Time a query waited for its embedding batch to be sent",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS
+)
+
+# Chat request rate, concurrency and per-stage latency, split by rag / direct mode
+chat_requests = meter.create_counter(
+    "chat.requests",
+    unit="{request}",
+    description="Chat requests received"
+)
+chat_inflight = meter.create_up_down_counter(
+    "chat.inflight",
+    unit="{request}",
+    description="Chat requests currently being processed"
+)
+chat_stage_duration = meter.create_histogram(
+    "chat.stage.duration",
+    unit="s",
+    description="Latency of a chat pipeline stage (intent, retrieval, context, generation, total)",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS
+)
+
+# Prompt context size after deduplication and the token budget
+context_tokens = meter.create_histogram(
+    "rag.context.tokens",
+    unit="{token}",
+    description="Tokens of retrieved context sent to the chat model per RAG request",
+    explicit_bucket_boundaries_advisory=[64, 128, 256, 512, 1024, 2048, 4096, 8192]
+)
+
+# Admission control: requests waiting for a chat slot, how long they waited, rejections
+admission_queue_depth = meter.create_up_down_counter(
+    "chat.admission.queue_depth",
+    unit="{request}",
+    description="Chat requests waiting for a concurrency slot"
+)
+admission_queue_wait = meter.create_histogram(
+    "chat.admission.queue_wait",
+    unit="s",
+    description="Time a chat request waited for a concurrency slot",
+    explicit_bucket_boundaries_advisory=LATENCY_BUCKETS
+)
+admission_rejected = meter.create_counter(
+    "chat.admission.rejected",
+    unit="{request}",
+    description="Chat requests rejected by admission control, by reason (queue_full, queue_timeout, token_budget)"
+)
+
+# LLM call resilience: retries, hedges, deadline misses and open circuits, by stage
+llm_resilience_events = meter.create_counter(
+    "llm.resilience.events",
+    unit="{event}",
+    description="Azure OpenAI resilience events by event (retry, retry_budget_exhausted, hedge, hedge_won, "
+                "deadline_exceeded, circuit_open) and stage"
+)
+
+# Model routing: chat calls by chosen deployment, tier and whether it was a failover
+llm_route_decisions = meter.create_counter(
+    "llm.route.decisions",
+    unit="{call}",
+    description="Chat LLM calls by routed deployment, tier and failover"
+)
+
+MODES = ("rag", "direct")
+STAGES = ("intent", "retrieval", "context", "generation", "total")
+MODE_ATTRIBUTES = {mode: {"mode": mode} for mode in MODES}
+REQUEST_ATTRIBUTES = {
+    (mode, streamed): {"mode": mode, "streamed": streamed} for mode in MODES for streamed in (False, True)
+}
+STAGE_ATTRIBUTES = {(stage, mode): {"stage": stage, "mode": mode} for stage in STAGES for mode in MODES}
+
+
+def record_stage(stage: str, mode: str, seconds: float):
+    chat_stage_duration.record(seconds, STAGE_ATTRIBUTES[(stage, mode)])
+
+
+def prometheus_exposition() -> bytes:
+    """Current metrics in Prometheus text format"""
+    return generate_latest(prometheus_registry)
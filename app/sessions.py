@@ -0,0 +1,245 @@
+"""
+Conversation Sessions
+=====================
+Server-side chat history, so follow-up questions do not have to resend the
+whole conversation and the prompt for turn N does not grow with N:
+
+- The most recent turns are kept verbatim; once there are more than
+  max_recent_turns of them, or they exceed history_token_budget, the oldest
+  are folded into a rolling summary by the summarize callback (an LLM call)
+- The history sent with a prompt is the summary (at most
+  summary_token_budget tokens) plus the newest verbatim turns that fit the
+  history budget, so it stays bounded even while a fold is still running
+- Session ids are random (new_session_id) and only ever created by the
+  server, so one conversation cannot be guessed or claimed by another client
+- SQLite reads and writes run in worker threads (asyncio.to_thread), so a
+  persistent store does not block the event loop on disk I/O
+- Sessions live in an LRU of max_sessions and expire ttl_seconds after
+  their last turn; with a path they are also stored in SQLite, so they
+  survive restarts and LRU eviction
+"""
+
+import asyncio
+import json
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def new_session_id() -> str:
+    """Unguessable id for a new session (128 random bits, URL safe)"""
+    return secrets.token_urlsafe(16)
+
+# Per-turn prompt token counts kept for GET /sessions/{id}
+PROMPT_TOKEN_HISTORY = 50
+
+
+@dataclass
+class Session:
+    """One conversation: rolling summary plus the most recent turns"""
+    key: str
+    summary: str = ""
+    # [question, answer] pairs, oldest first
+    turns: List[List[str]] = field(default_factory=list)
+    turn_count: int = 0
+    folded_turns: int = 0
+    prompt_tokens: List[int] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.time)
+
+
+class SessionStore:
+    """LRU/TTL-bounded sessions with incremental summarization and optional SQLite persistence"""
+
+    def __init__(self, summarize: Callable[[str, List[List[str]]], Awaitable[str]],
+                 count_tokens: Callable[[str], int], max_recent_turns: int = 4,
+                 history_token_budget: int = 1000, summary_token_budget: int = 300,
+                 max_sessions: int = 1000, ttl_seconds: float = 3600, path: Optional[str] = None):
+        self.summarize = summarize
+        self.count_tokens = count_tokens
+        self.max_recent_turns = max_recent_turns
+        self.history_token_budget = history_token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._folding = set()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+        self.folds = 0
+        self.fold_failures = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock:
+                # WAL keeps readers and the writer of the session file from blocking each other
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+                self._conn.commit()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _expired(self, session: Session) -> bool:
+        return time.time() - session.updated_at > self.ttl_seconds
+
+    def _load(self, key: str) -> Optional[Session]:
+        if self._conn is None:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE key = ?", (key,)).fetchone()
+        return Session(**json.loads(row[0])) if row else None
+
+    def _write(self, key: str, data: str, updated_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, updated_at) VALUES (?, ?, ?)",
+                (key, data, updated_at)
+            )
+            self._conn.commit()
+
+    async def _save(self, session: Session):
+        if self._conn is None:
+            return
+        # Serialized on the event loop, so the thread never sees a half-updated session
+        await asyncio.to_thread(self._write, session.key, json.dumps(asdict(session)), session.updated_at)
+
+    def _remember(self, session: Session):
+        self._sessions[session.key] = session
+        self._sessions.move_to_end(session.key)
+        while len(self._sessions) > self.max_sessions:
+            # Persisted sessions are reloaded from disk on their next turn
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def _delete_expired(self, before: float):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (before,))
+            self._conn.commit()
+
+    async def prune(self):
+        """Drop expired sessions from memory and disk"""
+        for key in [key for key, session in self._sessions.items() if self._expired(session)]:
+            del self._sessions[key]
+            self.expired += 1
+        if self._conn is not None:
+            await asyncio.to_thread(self._delete_expired, time.time() - self.ttl_seconds)
+
+    async def get(self, key: str, create: bool = False) -> Optional[Session]:
+        """The live session for key, a new one when create is set, else None"""
+        session = self._sessions.get(key)
+        if session is None and self._conn is not None:
+            loaded = await asyncio.to_thread(self._load, key)
+            # A concurrent request may have loaded it meanwhile; keep one Session object
+            session = self._sessions.get(key) or loaded
+        if session is not None and self._expired(session):
+            await self.delete(key)
+            self.expired += 1
+            session = None
+        if session is None:
+            if not create:
+                return None
+            await self.prune()
+            session = Session(key)
+            self.created += 1
+        self._remember(session)
+        return session
+
+    def _delete_row(self, key: str) -> bool:
+        with self._lock:
+            found = self._conn.execute("DELETE FROM sessions WHERE key = ?", (key,)).rowcount > 0
+            self._conn.commit()
+        return found
+
+    async def delete(self, key: str) -> bool:
+        found = self._sessions.pop(key, None) is not None
+        if self._conn is not None:
+            found = await asyncio.to_thread(self._delete_row, key) or found
+        return found
+
+    def _turn_tokens(self, turn: List[str]) -> int:
+        return self.count_tokens(turn[0]) + self.count_tokens(turn[1])
+
+    def history(self, session: Session) -> Tuple[str, List[List[str]]]:
+        """(summary, newest verbatim turns within the history budget) for the next prompt"""
+        recent, tokens = [], 0
+        for turn in reversed(session.turns[max(0, len(session.turns) - self.max_recent_turns):]):
+            tokens += self._turn_tokens(turn)
+            if tokens > self.history_token_budget:
+                break
+            recent.append(turn)
+        return session.summary, recent[::-1]
+
+    def _turns_to_fold(self, session: Session) -> int:
+        """How many of the oldest turns have to be folded to fit the turn and token limits"""
+        keep = min(len(session.turns), self.max_recent_turns)
+        tokens = sum(self._turn_tokens(turn) for turn in session.turns[-keep:]) if keep else 0
+        while keep and tokens > self.history_token_budget:
+            tokens -= self._turn_tokens(session.turns[-keep])
+            keep -= 1
+        return len(session.turns) - keep
+
+    async def record_turn(self, session: Session, question: str, answer: str, prompt_tokens: int) -> bool:
+        """Append a finished turn; returns whether older turns should now be folded (see fold)"""
+        session.turns.append([question, answer])
+        session.turn_count += 1
+        session.prompt_tokens = (session.prompt_tokens + [prompt_tokens])[-PROMPT_TOKEN_HISTORY:]
+        session.updated_at = time.time()
+        await self._save(session)
+        return self._turns_to_fold(session) > 0 and session.key not in self._folding
+
+    async def fold(self, session: Session):
+        """Summarize the oldest turns into the rolling summary (one fold per session at a time)"""
+        count = self._turns_to_fold(session)
+        if count == 0 or session.key in self._folding:
+            return
+        self._folding.add(session.key)
+        try:
+            folded = session.turns[:count]
+            try:
+                summary = await self.summarize(session.summary, folded)
+            except Exception:
+                # The turns stay verbatim (history() still bounds the prompt) and fold again next turn
+                self.fold_failures += 1
+                raise
+            tokens = self.count_tokens(summary)
+            if tokens > self.summary_token_budget:
+                summary = summary[:len(summary) * self.summary_token_budget // tokens]
+            # Only fold() removes turns, so the first count turns are still the folded ones
+            session.summary = summary
+            del session.turns[:count]
+            session.folded_turns += count
+            self.folds += 1
+            await self._save(session)
+        finally:
+            self._folding.discard(session.key)
+
+    def stats(self) -> dict:
+        return {
+            "persistent": self._conn is not None,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "max_recent_turns": self.max_recent_turns,
+            "history_token_budget": self.history_token_budget,
+            "summary_token_budget": self.summary_token_budget,
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "folds": self.folds,
+            "fold_failures": self.fold_failures,
+        }
@@ -0,0 +1,137 @@
+"""
+Multi-Tenant Knowledge Bases
+============================
+One process serves many tenants. Every tenant searches the shared base
+corpus (the workshop documents, embedded and indexed once) plus its own
+overlay collection holding only the documents it added.
+
+Overlay state is loaded on first use (Chroma collection, ingest manifest,
+BM25 index, semantic cache) and kept in an LRU registry. Least recently used
+tenants are dropped from memory once the loaded tenants exceed a memory cap
+or a tenant count; with a persistent vector store they are reloaded from
+disk on their next request.
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from coalescing import SingleFlight
+
+# Chroma collection names allow [a-zA-Z0-9._-], starting and ending alphanumeric
+TENANT_ID_PATTERN = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?$")
+TENANT_PATH = re.compile(r"^/tenants/([^/]+)(/.*)?$")
+
+# Rough resident size of one overlay chunk: a 1536-dimension float32 vector in
+# Chroma's HNSW segment plus its text and postings in the BM25 index
+CHUNK_BYTES_ESTIMATE = 1536 * 4 + 4096
+
+
+def collection_name(tenant_id: str) -> str:
+    return f"tenant_{tenant_id}"
+
+
+class Tenant:
+    """A tenant's overlay: vector store, manifest, BM25 index and response cache"""
+
+    def __init__(self, tenant_id: str, vectorstore, manifest, lexical_index, semantic_cache,
+                 write_lock: Optional[asyncio.Lock] = None, collection=None):
+        self.tenant_id = tenant_id
+        # None until the tenant adds its first document
+        self.vectorstore = vectorstore
+        # The chromadb collection behind vectorstore, for scored similarity search
+        self.collection = collection
+        self.manifest = manifest
+        self.lexical_index = lexical_index
+        self.semantic_cache = semantic_cache
+        # Serializes writes to this tenant's collection and manifest
+        self.write_lock = write_lock or asyncio.Lock()
+        self.loaded_at = time.monotonic()
+
+    def memory_bytes(self) -> int:
+        return len(self.manifest) * CHUNK_BYTES_ESTIMATE
+
+
+class TenantRegistry:
+    """
+    LRU of loaded tenants. loader(tenant_id) builds a Tenant and runs in a
+    worker thread; concurrent requests for a tenant that is not loaded share
+    one load.
+    """
+
+    def __init__(self, loader: Callable[[str], Tenant], max_tenants: int = 64,
+                 max_memory_bytes: int = 512 * 1024 * 1024):
+        self.loader = loader
+        self.max_tenants = max_tenants
+        self.max_memory_bytes = max_memory_bytes
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._loads = SingleFlight()
+        self.loads = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._tenants)
+
+    async def get(self, tenant_id: str) -> Tenant:
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            self._tenants.move_to_end(tenant_id)
+            return tenant
+        tenant, _, _ = await self._loads.do((tenant_id,), lambda: self._load(tenant_id))
+        return tenant
+
+    async def _load(self, tenant_id: str) -> Tenant:
+        tenant = await asyncio.to_thread(self.loader, tenant_id)
+        self.loads += 1
+        self._tenants[tenant_id] = tenant
+        self.enforce_limits(keep=tenant_id)
+        return tenant
+
+    def loaded(self) -> list:
+        return list(self._tenants.values())
+
+    def memory_bytes(self) -> int:
+        return sum(tenant.memory_bytes() for tenant in self._tenants.values())
+
+    def enforce_limits(self, keep: Optional[str] = None):
+        """Evict least recently used tenants until both limits hold (keep is never evicted)"""
+        while len(self._tenants) > 1 and (
+                len(self._tenants) > self.max_tenants or self.memory_bytes() > self.max_memory_bytes):
+            tenant_id = next(iter(self._tenants))
+            if tenant_id == keep:
+                self._tenants.move_to_end(tenant_id)
+                tenant_id = next(iter(self._tenants))
+            # Requests still holding the Tenant finish with it; the next one reloads it
+            del self._tenants[tenant_id]
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "loaded": len(self._tenants),
+            "max_tenants": self.max_tenants,
+            "memory_mb": round(self.memory_bytes() / (1024 * 1024), 1),
+            "max_memory_mb": round(self.max_memory_bytes / (1024 * 1024), 1),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
+
+
+class TenantPathMiddleware:
+    """
+    ASGI middleware serving /tenants/{tenant_id}/<path> as /<path>, with the
+    tenant id in the request state (request.state.tenant_id)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            match = TENANT_PATH.match(scope["path"])
+            if match:
+                path = match.group(2) or "/"
+                scope = dict(scope, path=path, raw_path=path.encode(),
+                             state={**scope.get("state", {}), "tenant_id": match.group(1)})
+        await self.app(scope, receive, send)
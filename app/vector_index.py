@@ -0,0 +1,288 @@
+"""
+Vector Index Maintenance
+========================
+Keeps the Chroma collection in sync with the configured corpus.
+
+Every chunk is stored under a content hash as its Chroma id, and an ingest
+manifest records which ids came from the configured corpus and which were
+added through /documents. On startup only chunks that are not in the
+collection yet are embedded; corpus chunks that were removed from the
+configuration are deleted, documents added at runtime are kept.
+
+When several processes share one collection (a Chroma server), the
+collection stays the source of truth: refresh_from_store() picks up chunks
+other processes added or deleted.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process startup lock
+    fcntl = None
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+from langchain_core.documents import Document
+
+
+def chunk_id(text: str) -> str:
+    """Content address of a chunk, used as its vector store id"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class IngestManifest:
+    """Record of ingested chunk hashes, persisted as JSON next to the collection"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.corpus = set()
+        self.documents = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.corpus = set(data.get("corpus", []))
+            self.documents = set(data.get("documents", []))
+
+    def __contains__(self, chunk_hash: str) -> bool:
+        return chunk_hash in self.corpus or chunk_hash in self.documents
+
+    def __len__(self) -> int:
+        return len(self.corpus | self.documents)
+
+    def save(self):
+        """Write the manifest atomically (no-op for in-memory stores)"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {"corpus": sorted(self.corpus), "documents": sorted(self.documents)}
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+
+def open_chroma_client(persist_directory: Optional[str] = None, memory_limit_bytes: int = 0,
+                       server_url: Optional[str] = None):
+    """
+    Chroma client shared by every collection. With server_url the collections
+    live in a Chroma server that several processes can share. Persistent
+    clients keep at most memory_limit_bytes of collection segments loaded
+    (LRU, 0 = unlimited) and reload evicted ones from disk; in-memory clients
+    cannot evict.
+    """
+    if server_url:
+        url = urlparse(server_url)
+        return chromadb.HttpClient(
+            host=url.hostname,
+            port=url.port or (443 if url.scheme == "https" else 8000),
+            ssl=url.scheme == "https",
+            settings=Settings(anonymized_telemetry=False)
+        )
+    if not persist_directory:
+        # Same settings as langchain's Chroma wrapper uses for in-memory stores
+        return chromadb.Client(Settings(is_persistent=False))
+    settings = Settings(anonymized_telemetry=False)
+    if memory_limit_bytes:
+        settings = Settings(
+            anonymized_telemetry=False,
+            chroma_segment_cache_policy="LRU",
+            chroma_memory_limit_bytes=memory_limit_bytes
+        )
+    return chromadb.PersistentClient(path=persist_directory, settings=settings)
+
+
+@contextmanager
+def process_lock(path: Optional[str]):
+    """Exclusive lock across processes on one host (no-op without a path or on Windows)"""
+    if not path or fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def stored_ids(vectorstore) -> set:
+    """All chunk ids currently held by the vector store"""
+    return set(vectorstore.get(include=[])["ids"])
+
+
+def sync_corpus(vectorstore, manifest: IngestManifest, chunks: List[Document],
+                batch_size: int = 64,
+                on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+    """
+    Diff the configured corpus against the manifest and apply the difference.
+    New chunks are embedded and inserted batch by batch; on_progress is called
+    with (chunks embedded, chunks to embed) after each batch.
+    Returns counts of added, removed and unchanged chunks.
+    """
+    configured = {}
+    for chunk in chunks:
+        configured.setdefault(chunk_id(chunk.page_content), chunk)
+
+    # The collection is the source of truth for what is actually stored
+    existing = stored_ids(vectorstore)
+    manifest.corpus &= existing
+    manifest.documents &= existing
+
+    new_ids = [chunk_hash for chunk_hash in configured if chunk_hash not in existing]
+    stale_ids = [chunk_hash for chunk_hash in manifest.corpus
+                 if chunk_hash not in configured and chunk_hash not in manifest.documents]
+
+    if on_progress:
+        on_progress(0, len(new_ids))
+    for start in range(0, len(new_ids), batch_size):
+        batch_ids = new_ids[start:start + batch_size]
+        vectorstore.add_documents([configured[chunk_hash] for chunk_hash in batch_ids], ids=batch_ids)
+        if on_progress:
+            on_progress(start + len(batch_ids), len(new_ids))
+    if stale_ids:
+        vectorstore.delete(ids=stale_ids)
+
+    manifest.corpus = set(configured)
+    # Anything else the collection holds was added at runtime, possibly by another process
+    manifest.documents = existing - set(stale_ids) - manifest.corpus
+    manifest.save()
+    return {
+        "added": len(new_ids),
+        "removed": len(stale_ids),
+        "unchanged": len(configured) - len(new_ids),
+    }
+
+
+def add_chunks(vectorstore, manifest: IngestManifest, chunks: List[Document], lexical_index=None,
+               shared_manifest: Optional[IngestManifest] = None) -> int:
+    """
+    Add runtime documents, skipping chunks that are already indexed, in this
+    collection or in the one shared_manifest describes (a tenant's copy of a
+    base corpus chunk would only duplicate its vector).
+    New chunks are also added to lexical_index (a BM25Index) when given.
+    Returns the number of chunks that were embedded and inserted.
+    """
+    new_chunks = {}
+    owned = set()
+    for chunk in chunks:
+        chunk_hash = chunk_id(chunk.page_content)
+        if shared_manifest is not None and chunk_hash in shared_manifest:
+            continue
+        owned.add(chunk_hash)
+        if chunk_hash not in manifest and chunk_hash not in new_chunks:
+            new_chunks[chunk_hash] = chunk
+    if new_chunks:
+        # Another process sharing the collection may have stored some of them already
+        for chunk_hash in vectorstore.get(ids=list(new_chunks), include=[])["ids"]:
+            del new_chunks[chunk_hash]
+    if new_chunks:
+        vectorstore.add_documents(list(new_chunks.values()), ids=list(new_chunks.keys()))
+        if lexical_index is not None:
+            lexical_index.add(list(new_chunks.keys()), list(new_chunks.values()))
+    manifest.documents.update(owned)
+    manifest.save()
+    return len(new_chunks)
+
+
+def refresh_from_store(vectorstore, manifest: IngestManifest, lexical_index=None) -> int:
+    """
+    Catch up with chunks other processes added to or deleted from a shared
+    collection: the manifest and lexical_index are brought in line with it.
+    The stored id set is compared rather than the chunk count, so an add and
+    a delete between two polls are not mistaken for no change; ids are content
+    hashes, so a replaced chunk shows up as one removed and one added id.
+    Returns the number of chunks added plus removed.
+    """
+    existing = stored_ids(vectorstore)
+    if existing == manifest.corpus | manifest.documents:
+        return 0
+    added = [chunk_hash for chunk_hash in existing if chunk_hash not in manifest]
+    removed = (manifest.corpus | manifest.documents) - existing
+    if lexical_index is not None:
+        if removed:
+            lexical_index.remove(removed)
+        if added:
+            stored = vectorstore.get(ids=added, include=["documents", "metadatas"])
+            lexical_index.add(stored["ids"], [
+                Document(page_content=text, metadata=metadata or {})
+                for text, metadata in zip(stored["documents"], stored["metadatas"])
+            ])
+    manifest.corpus -= removed
+    manifest.documents -= removed
+    manifest.documents.update(added)
+    return len(added) + len(removed)
+
+
+def search_with_similarity(collection, embedding: Sequence[float], k: int,
+                           extra_ids: Sequence[str] = ()) -> List[Tuple[str, Document, float]]:
+    """
+    The k nearest chunks to embedding in a chromadb collection as (id, document,
+    cosine similarity), nearest first, followed by any extra_ids that were not
+    among them.
+
+    Similarity is computed from the stored vectors, so it is comparable across
+    collections whatever distance function they were created with.
+    """
+    include = ["documents", "metadatas", "embeddings"]
+    result = collection.query(query_embeddings=[list(embedding)], n_results=k, include=include)
+    ids = list(result["ids"][0])
+    texts = list(result["documents"][0])
+    metadatas = list(result["metadatas"][0])
+    vectors = list(result["embeddings"][0])
+    missing = [doc_id for doc_id in dict.fromkeys(extra_ids) if doc_id not in set(ids)]
+    if missing:
+        extra = collection.get(ids=missing, include=include)
+        ids += extra["ids"]
+        texts += extra["documents"]
+        metadatas += extra["metadatas"]
+        vectors += list(extra["embeddings"])
+    if not ids:
+        return []
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    query = np.asarray(embedding, dtype=np.float32)
+    similarities = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+    return [
+        (doc_id, Document(page_content=text, metadata=metadata or {}), float(similarity))
+        for doc_id, text, metadata, similarity in zip(ids, texts, metadatas, similarities)
+    ]
+
+
+def search_many_with_similarity(collections: Sequence, embedding: Sequence[float], k: int,
+                                extra_ids: Optional[Sequence[Sequence[str]]] = None
+                                ) -> List[Tuple[str, Document, float]]:
+    """
+    search_with_similarity over several collections (extra_ids holds one id
+    list per collection), merged most similar first
+    """
+    scored = []
+    for i, collection in enumerate(collections):
+        scored += search_with_similarity(collection, embedding, k, extra_ids[i] if extra_ids else ())
+    return sorted(scored, key=lambda item: item[2], reverse=True)
+
+
+def select_adaptive_k(ranked: List[Tuple[Document, float]], min_score: float, max_k: int,
+                      max_gap: float) -> List[Tuple[Document, float]]:
+    """
+    Keep ranked (document, similarity) pairs that are within max_gap of the
+    best similarity, at most max_k, in rank order. min_score is only a low
+    absolute floor: the best hit is always kept when it reaches it, and an
+    empty list means nothing was relevant at all.
+    """
+    if not ranked:
+        return []
+    best = max(score for _, score in ranked)
+    if best < min_score:
+        return []
+    cutoff = max(min_score, best - max_gap)
+    return [(doc, score) for doc, score in ranked if score >= cutoff][:max_k]
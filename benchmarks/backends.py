@@ -0,0 +1,91 @@
+"""
+Deterministic benchmark backends
+================================
+Stand-ins for the Azure OpenAI chat and embedding clients, so the pipeline
+can be benchmarked without network access and with repeatable results.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, AsyncIterator, List, Optional
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+ANSWER = (
+    "Dynatrace captures every LLM call as a span with its prompt, completion, token usage "
+    "and latency, so a RAG request can be followed from retrieval through generation."
+)
+
+VOCABULARY = (
+    "dynatrace davis grail oneagent trace span metric log openllmetry traceloop otlp "
+    "latency token prompt completion embedding vector retrieval chunk index query cache "
+    "kubernetes service endpoint deployment anomaly root cause dashboard notebook dql "
+    "the a of to and in for with on is are by from that this as at be it observability"
+).split()
+
+
+def _count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning a fixed answer after a fixed latency, with usage metadata"""
+
+    response: str = ANSWER
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark-fake-chat"
+
+    def _message(self, messages: List[BaseMessage]) -> AIMessage:
+        input_tokens = sum(_count_tokens(str(message.content)) for message in messages)
+        output_tokens = _count_tokens(self.response)
+        return AIMessage(content=self.response, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for i, word in enumerate(self.response.split()):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+
+def make_embeddings(dimensions: int) -> DeterministicFakeEmbedding:
+    """Embeddings seeded by a hash of the text: identical texts get identical vectors"""
+    return DeterministicFakeEmbedding(size=dimensions)
+
+
+def make_corpus(size: int, seed: int = 0, words: int = 60) -> List[str]:
+    """size synthetic documents, each short enough to become exactly one chunk"""
+    rng = random.Random(seed)
+    return [
+        f"Document {i}: " + " ".join(rng.choice(VOCABULARY) for _ in range(words))
+        for i in range(size)
+    ]
+
+
+def make_queries(count: int, seed: int = 1) -> List[str]:
+    """Distinct queries, so request coalescing and caches do not hide pipeline work"""
+    rng = random.Random(seed)
+    return [
+        f"How does {rng.choice(VOCABULARY)} relate to {rng.choice(VOCABULARY)}? ({i})"
+        for i in range(count)
+    ]
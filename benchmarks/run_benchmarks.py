@@ -0,0 +1,341 @@
+"""
+RAG Pipeline Benchmarks
+=======================
+Stage-level benchmarks for the chat service, run in-process against
+deterministic chat and embedding backends (see backends.py).
+
+Stages:
+- split               text splitting of the corpus (split_documents)
+- index               initialize_rag: split + embed + vector store sync
+- format_docs         joining retrieved chunks
+- generate_context    context formatting step of the pipeline
+- summarize_sources   source snippets step of the pipeline
+- retrieve            retrieve_documents (query embedding + vector search)
+- rag_chat            process_rag_chat end to end
+- documents_ingest    POST /documents
+
+Every stage reports latency percentiles, throughput and peak traced
+allocations (tracemalloc, measured in a separate untimed run).
+
+Usage (from the repository root):
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 10,1000,100000 --concurrency 1,16,64
+    python benchmarks/run_benchmarks.py --output benchmarks/baselines/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baselines/baseline.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARK_DIR.parent
+APP_DIR = REPO_ROOT / "app"
+
+# Configure the service before it is imported: no real endpoints, no on-disk
+# state, and no caching or coalescing that would hide the work being measured
+os.environ.update({
+    "AZURE_OPENAI_ENDPOINT": "http://benchmark.invalid",
+    "AZURE_OPENAI_API_KEY": "benchmark",
+    "EMBEDDING_CACHE_PATH": ":memory:",
+    "VECTORSTORE_DIR": "",
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "CHAT_COALESCING_ENABLED": "false",
+    "INTENT_BACKEND": "llm",
+    # The fake embeddings are random, so every chunk passes the relevance cutoff
+    # and retrieval always returns RETRIEVAL_MAX_K chunks
+    "RETRIEVAL_MIN_SCORE": "-1",
+    "RETRIEVAL_SCORE_GAP": "2",
+})
+for name in ("DT_ENDPOINT", "DT_API_TOKEN"):
+    os.environ.pop(name, None)
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(BENCHMARK_DIR))
+
+import logging  # noqa: E402
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+from backends import FakeChatModel, make_corpus, make_embeddings, make_queries  # noqa: E402
+from ingest import split_documents  # noqa: E402
+
+logging.getLogger().setLevel(logging.WARNING)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Measurement
+# ═══════════════════════════════════════════════════════════════════════════
+
+def summarize(stage: str, latencies: List[float], elapsed: float, ops: int, peak_bytes: Optional[int],
+              **params) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "stage": stage,
+        **params,
+        "ops": ops,
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        "throughput_per_s": round(ops / elapsed, 2) if elapsed else None,
+        "peak_alloc_kib": round(peak_bytes / 1024, 1) if peak_bytes is not None else None,
+    }
+
+
+def traced_peak(fn: Callable[[], None]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_sync(stage: str, fn: Callable[[], object], repeat: int, items: int = 1,
+               setup: Callable[[], None] = None, track_alloc: bool = True, **params) -> dict:
+    """Time fn() repeat times; items is the number of units one call processes"""
+    latencies = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - started)
+    peak = None
+    if track_alloc:
+        if setup:
+            setup()
+        peak = traced_peak(fn)
+    return summarize(stage, latencies, sum(latencies), repeat * items, peak, **params)
+
+
+async def bench_async(stage: str, call: Callable[[int], Awaitable], total: int, concurrency: int,
+                      track_alloc: bool = True, **params) -> dict:
+    """Run call(i) for i in range(total) with `concurrency` workers"""
+    async def run(calls: range) -> List[float]:
+        latencies = []
+        indexes = iter(calls)
+
+        async def worker():
+            for i in indexes:
+                started = time.perf_counter()
+                await call(i)
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies
+
+    started = time.perf_counter()
+    latencies = await run(range(total))
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    if track_alloc:
+        tracemalloc.start()
+        try:
+            await run(range(total, total + concurrency))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return summarize(stage, latencies, elapsed, total, peak, concurrency=concurrency, **params)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Stages
+# ═══════════════════════════════════════════════════════════════════════════
+
+def use_backends(args):
+    chat_model = FakeChatModel(latency=args.llm_latency_ms / 1000)
+    embedding_model = make_embeddings(args.embedding_dim)
+    main.clients.chat = lambda deployment, temperature=0.7: chat_model
+    main.clients.embeddings = lambda deployment: embedding_model
+
+
+def reset_index():
+    if main.vectorstore is not None:
+        main.vectorstore.delete_collection()
+    main.vectorstore = main.retriever = None
+
+
+def index_corpus(corpus: List[str]):
+    main.SAMPLE_DOCUMENTS = corpus
+    if not main.initialize_rag():
+        raise RuntimeError(main.rag_status["error"])
+
+
+async def bench_corpus(size: int, args) -> List[dict]:
+    results = []
+    corpus = make_corpus(size, seed=args.seed)
+    track_alloc = size <= args.alloc_max_size
+    repeat = max(1, min(args.repeat, args.max_items // size))
+    print(f"▶ corpus of {size} documents")
+
+    items = [(text, None) for text in corpus]
+    chunks = len(split_documents(items))
+    results.append(bench_sync("split", lambda: split_documents(items), repeat, items=chunks,
+                              track_alloc=track_alloc, corpus_size=size))
+
+    results.append(bench_sync("index", lambda: index_corpus(corpus), repeat, items=chunks,
+                              setup=reset_index, track_alloc=track_alloc, corpus_size=size))
+
+    queries = make_queries(args.requests * (len(args.concurrency) + 1) * 2 + 64, seed=args.seed + 1)
+    offset = itertools.count()
+
+    async def retrieve(i):
+        return await main.retrieve_documents(queries[next(offset) % len(queries)])
+
+    async def rag_chat(i):
+        return await main.process_rag_chat(queries[next(offset) % len(queries)])
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def ingest(i):
+            # Fresh content every time, so every request embeds and inserts one chunk
+            text = make_corpus(1, seed=args.seed * 1_000_003 + size * 7919 + next(offset))[0]
+            response = await client.post("/documents", json={"content": text})
+            response.raise_for_status()
+
+        for concurrency in args.concurrency:
+            for stage, call in (("retrieve", retrieve), ("rag_chat", rag_chat), ("documents_ingest", ingest)):
+                results.append(await bench_async(stage, call, args.requests, concurrency,
+                                                 track_alloc=track_alloc, corpus_size=size))
+    reset_index()
+    return results
+
+
+def bench_formatting(args) -> List[dict]:
+    """Post-retrieval steps on retrieved document lists of a few sizes"""
+    from langchain_core.documents import Document
+
+    results = []
+    for count in (main.RETRIEVAL_K, 20, 100):
+        docs = [Document(page_content=text) for text in make_corpus(count, seed=args.seed)]
+        for stage, fn in (("format_docs", main.format_docs),
+                          ("generate_context", main.generate_context),
+                          ("summarize_sources", main.summarize_sources)):
+            results.append(bench_sync(stage, lambda: fn(docs), args.micro_repeat, docs=count))
+    return results
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Reporting
+# ═══════════════════════════════════════════════════════════════════════════
+
+def result_key(result: dict) -> tuple:
+    return (result["stage"], result.get("corpus_size"), result.get("concurrency"), result.get("docs"))
+
+
+def describe(key: tuple) -> str:
+    stage, size, concurrency, docs = key
+    parts = [stage]
+    if size is not None:
+        parts.append(f"n={size}")
+    if concurrency is not None:
+        parts.append(f"c={concurrency}")
+    if docs is not None:
+        parts.append(f"docs={docs}")
+    return " ".join(parts)
+
+
+def print_results(results: List[dict]):
+    print(f"\n{'benchmark':<34}{'p50 ms':>12}{'p95 ms':>12}{'ops/s':>12}{'peak KiB':>12}")
+    for result in results:
+        peak = result["peak_alloc_kib"]
+        print(f"{describe(result_key(result)):<34}{result['p50_ms']:>12.3f}{result['p95_ms']:>12.3f}"
+              f"{result['throughput_per_s'] or 0:>12.1f}{peak if peak is not None else '-':>12}")
+
+
+def compare(results: List[dict], baseline_path: str, max_regression: float) -> bool:
+    """Print p50 / throughput changes against a baseline; False if any p50 regressed too much"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {result_key(r): r for r in json.load(f)["results"]}
+    ok = True
+    print(f"\nCompared with {baseline_path} (regression threshold {max_regression:.0%} on p50)")
+    print(f"{'benchmark':<34}{'p50 base':>12}{'p50 now':>12}{'change':>10}")
+    for result in results:
+        key = result_key(result)
+        if key not in baseline:
+            continue
+        before, after = baseline[key]["p50_ms"], result["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        regressed = change > max_regression
+        ok = ok and not regressed
+        marker = "  ❌" if regressed else ""
+        print(f"{describe(key):<34}{before:>12.3f}{after:>12.3f}{change:>+10.1%}{marker}")
+    return ok
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks for the RAG pipeline")
+    parser.add_argument("--sizes", type=parse_list, default=[10, 100, 1000, 10000],
+                        help="corpus sizes in chunks (default 10,100,1000,10000; up to 100000 is supported)")
+    parser.add_argument("--concurrency", type=parse_list, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=64, help="requests per async benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="repetitions of split / index")
+    parser.add_argument("--max-items", type=int, default=20000,
+                        help="cap on repeat x corpus size for split / index")
+    parser.add_argument("--micro-repeat", type=int, default=2000, help="repetitions of formatting steps")
+    parser.add_argument("--alloc-max-size", type=int, default=10000,
+                        help="largest corpus for which allocations are traced")
+    parser.add_argument("--embedding-dim", type=int, default=256)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="simulated chat latency (0 measures pure pipeline overhead)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=str(BENCHMARK_DIR / "results" / "latest.json"))
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    use_backends(args)
+
+    async def run_all() -> List[dict]:
+        results = bench_formatting(args)
+        for size in args.sizes:
+            results.extend(await bench_corpus(size, args))
+        return results
+
+    results = asyncio.run(run_all())
+    print_results(results)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
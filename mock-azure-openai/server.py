@@ -0,0 +1,258 @@
+"""
+Mock Azure OpenAI Server
+========================
+Local stand-in for the Azure OpenAI routes used by AzureChatOpenAI and
+AzureOpenAIEmbeddings, for load testing the chat service without
+credentials or network access.
+
+Routes:
+- POST /openai/deployments/{deployment}/chat/completions (JSON or SSE streaming)
+- POST /openai/deployments/{deployment}/embeddings (float or base64 encoding)
+
+Latency, token rate, error injection and the embedding dimensions are set
+with MOCK_* environment variables (see README.md). Embeddings are
+deterministic: the same input always gives the same vector, and inputs that
+share words get similar vectors, so retrieval and caching behave plausibly.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from functools import lru_cache
+from typing import List, Union
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Configuration
+# ═══════════════════════════════════════════════════════════════════════════
+
+MOCK_HOST = os.getenv("MOCK_HOST", "127.0.0.1")
+MOCK_PORT = int(os.getenv("MOCK_PORT", 8090))
+
+# Latencies are lognormal: the *_MS value is the median, MOCK_LATENCY_SIGMA the
+# spread (0 = fixed latency, 0.5 gives a p99 of roughly 3x the median)
+MOCK_CHAT_TTFT_MS = float(os.getenv("MOCK_CHAT_TTFT_MS", 300))
+MOCK_CHAT_TOKENS_PER_SECOND = float(os.getenv("MOCK_CHAT_TOKENS_PER_SECOND", 80))
+MOCK_CHAT_COMPLETION_TOKENS = int(os.getenv("MOCK_CHAT_COMPLETION_TOKENS", 120))
+MOCK_EMBEDDING_LATENCY_MS = float(os.getenv("MOCK_EMBEDDING_LATENCY_MS", 40))
+MOCK_EMBEDDING_PER_INPUT_MS = float(os.getenv("MOCK_EMBEDDING_PER_INPUT_MS", 0.5))
+MOCK_LATENCY_SIGMA = float(os.getenv("MOCK_LATENCY_SIGMA", 0.3))
+
+# Fraction of requests answered with 429 (with Retry-After) or a 500/503
+MOCK_ERROR_RATE_429 = float(os.getenv("MOCK_ERROR_RATE_429", 0))
+MOCK_ERROR_RATE_5XX = float(os.getenv("MOCK_ERROR_RATE_5XX", 0))
+MOCK_RETRY_AFTER_MS = int(os.getenv("MOCK_RETRY_AFTER_MS", 1000))
+
+MOCK_EMBEDDING_DIMENSIONS = int(os.getenv("MOCK_EMBEDDING_DIMENSIONS", 1536))
+# Seeds latency and error sampling; embeddings are deterministic regardless
+MOCK_SEED = os.getenv("MOCK_SEED")
+
+rng = random.Random(int(MOCK_SEED) if MOCK_SEED else None)
+
+app = FastAPI(title="Mock Azure OpenAI", version="1.0.0")
+
+stats = {"chat_requests": 0, "embedding_requests": 0, "embedding_inputs": 0, "errors_429": 0, "errors_5xx": 0}
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Helpers
+# ═══════════════════════════════════════════════════════════════════════════
+
+LOREM = (
+    "Dynatrace traces every LLM call as a span with its prompt, completion, token usage and latency, "
+    "so you can follow a RAG request from retrieval through generation and spot slow or costly steps. "
+    "OpenLLMetry instruments LangChain automatically and exports the spans over OTLP."
+).split()
+
+INTENT_LABELS = ("technical", "conceptual", "troubleshooting", "general")
+
+
+def sample_latency(median_ms: float) -> float:
+    """Lognormal latency in seconds around median_ms"""
+    if median_ms <= 0:
+        return 0.0
+    return median_ms * rng.lognormvariate(0, MOCK_LATENCY_SIGMA) / 1000 if MOCK_LATENCY_SIGMA > 0 else median_ms / 1000
+
+
+def count_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, (len(text) + 3) // 4)
+
+
+def injected_error() -> Union[JSONResponse, None]:
+    """Randomly return a 429 or 5xx response per the configured error rates"""
+    roll = rng.random()
+    if roll < MOCK_ERROR_RATE_429:
+        stats["errors_429"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after-ms": str(MOCK_RETRY_AFTER_MS), "retry-after": str(max(1, MOCK_RETRY_AFTER_MS // 1000))},
+            content={"error": {"code": "429", "message": "Requests to the deployment have exceeded the rate limit (mock)."}}
+        )
+    if roll < MOCK_ERROR_RATE_429 + MOCK_ERROR_RATE_5XX:
+        stats["errors_5xx"] += 1
+        status = rng.choice((500, 503))
+        return JSONResponse(
+            status_code=status,
+            content={"error": {"code": str(status), "message": "The server had an error processing the request (mock)."}}
+        )
+    return None
+
+
+def message_text(messages: list) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+
+def completion_words(prompt: str, max_tokens: int) -> List[str]:
+    """Deterministic completion for a prompt; classification prompts get a single label"""
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+    if "Classify the following query" in prompt:
+        return [INTENT_LABELS[digest % len(INTENT_LABELS)]]
+    count = min(MOCK_CHAT_COMPLETION_TOKENS, max_tokens) if max_tokens else MOCK_CHAT_COMPLETION_TOKENS
+    offset = digest % len(LOREM)
+    return [LOREM[(offset + i) % len(LOREM)] for i in range(count)]
+
+
+@lru_cache(maxsize=65536)
+def token_vector(token: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(token.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(MOCK_EMBEDDING_DIMENSIONS).astype(np.float32)
+
+
+def embed(item: Union[str, List[int]]) -> np.ndarray:
+    """Unit-length bag-of-tokens vector; accepts text or pre-tokenized input"""
+    tokens = item.lower().split() if isinstance(item, str) else [str(token) for token in item]
+    vector = np.zeros(MOCK_EMBEDDING_DIMENSIONS, dtype=np.float32)
+    for token in tokens or [""]:
+        vector += token_vector(token)
+    return vector / np.linalg.norm(vector)
+
+
+def chunk_payload(completion_id: str, model: str, created: int, delta: dict, finish_reason=None) -> str:
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }) + "\n\n"
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Routes
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    stats["chat_requests"] += 1
+    body = await request.json()
+    error = injected_error()
+    if error is not None:
+        return error
+
+    prompt = message_text(body.get("messages", []))
+    words = completion_words(prompt, body.get("max_tokens") or body.get("max_completion_tokens"))
+    usage = {
+        "prompt_tokens": count_tokens(prompt),
+        "completion_tokens": len(words),
+        "total_tokens": count_tokens(prompt) + len(words),
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+    completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+    token_delay = 1 / MOCK_CHAT_TOKENS_PER_SECOND if MOCK_CHAT_TOKENS_PER_SECOND > 0 else 0
+
+    if not body.get("stream"):
+        await asyncio.sleep(sample_latency(MOCK_CHAT_TTFT_MS) + token_delay * len(words))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": deployment,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": " ".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    async def event_stream():
+        await asyncio.sleep(sample_latency(MOCK_CHAT_TTFT_MS))
+        yield chunk_payload(completion_id, deployment, created, {"role": "assistant", "content": ""})
+        for i, word in enumerate(words):
+            yield chunk_payload(completion_id, deployment, created, {"content": word if i == 0 else " " + word})
+            await asyncio.sleep(token_delay)
+        yield chunk_payload(completion_id, deployment, created, {}, finish_reason="stop")
+        if include_usage:
+            yield "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": deployment,
+                "choices": [],
+                "usage": usage,
+            }) + "\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+async def embeddings(deployment: str, request: Request):
+    stats["embedding_requests"] += 1
+    body = await request.json()
+    inputs = body.get("input", [])
+    # A single string or a single token list is one input
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    stats["embedding_inputs"] += len(inputs)
+    error = injected_error()
+    if error is not None:
+        return error
+
+    await asyncio.sleep(sample_latency(MOCK_EMBEDDING_LATENCY_MS) + MOCK_EMBEDDING_PER_INPUT_MS * len(inputs) / 1000)
+
+    data = []
+    for index, item in enumerate(inputs):
+        vector = embed(item)
+        if body.get("encoding_format") == "base64":
+            encoded = base64.b64encode(vector.tobytes()).decode("ascii")
+        else:
+            encoded = vector.tolist()
+        data.append({"object": "embedding", "index": index, "embedding": encoded})
+    prompt_tokens = sum(count_tokens(item) if isinstance(item, str) else len(item) for item in inputs)
+    return {
+        "object": "list",
+        "model": deployment,
+        "data": data,
+        "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+    }
+
+
+@app.get("/health")
+async def health():
+    return {"status": "healthy", **stats}
+
+
+if __name__ == "__main__":
+    print(f"🧪 Mock Azure OpenAI listening on http://{MOCK_HOST}:{MOCK_PORT}")
+    print(f"   Chat: {MOCK_CHAT_TTFT_MS:.0f} ms TTFT, {MOCK_CHAT_TOKENS_PER_SECOND:.0f} tokens/s, "
+          f"{MOCK_CHAT_COMPLETION_TOKENS} tokens per answer")
+    print(f"   Errors: {MOCK_ERROR_RATE_429:.0%} 429 / {MOCK_ERROR_RATE_5XX:.0%} 5xx")
+    uvicorn.run(app, host=MOCK_HOST, port=MOCK_PORT, log_level="warning")
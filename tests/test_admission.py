@@ -0,0 +1,205 @@
+"""
+Admission control: token bucket refill, per-tenant token budgets (429) and the
+bounded wait queue (503), each with a Retry-After estimate
+
+Bucket and hold-time arithmetic runs on a fake clock.
+"""
+
+import asyncio
+import os
+import sys
+import types
+from pathlib import Path
+
+import httpx
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# Configure the service before it is imported: no real endpoints and no on-disk state
+os.environ.update({
+    "AZURE_OPENAI_ENDPOINT": "http://test.invalid",
+    "AZURE_OPENAI_API_KEY": "test",
+    "EMBEDDING_CACHE_PATH": ":memory:",
+    "VECTORSTORE_DIR": "",
+})
+for name in ("DT_ENDPOINT", "DT_API_TOKEN"):
+    os.environ.pop(name, None)
+sys.path.insert(0, str(APP_DIR))
+
+import admission  # noqa: E402
+import main  # noqa: E402
+from admission import AdmissionRejected, ConcurrencyLimiter, TokenBucket, TokenBudgets  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # Replace the module's time, not time.monotonic itself, which the event loop uses
+    monkeypatch.setattr(admission, "time", types.SimpleNamespace(monotonic=fake.monotonic))
+    return fake
+
+
+def test_token_bucket_refills_at_its_rate(clock):
+    bucket = TokenBucket(rate=10, capacity=100)
+    assert bucket.take(100) == 0
+    assert bucket.take(50) == pytest.approx(5.0)
+    clock.advance(2)
+    assert bucket.take(50) == pytest.approx(3.0)
+    clock.advance(3)
+    assert bucket.take(50) == 0
+    # Refill stops at capacity
+    clock.advance(3600)
+    assert bucket.take(100) == 0
+    assert bucket.take(1) == pytest.approx(0.1)
+
+
+def test_oversized_request_passes_once_the_bucket_is_full(clock):
+    bucket = TokenBucket(rate=10, capacity=100)
+    assert bucket.take(500) == 0
+    assert bucket.take(500) == pytest.approx(10.0)
+
+
+def test_token_budget_rejects_with_429_and_retry_after(clock):
+    budgets = TokenBudgets(tokens_per_minute=600, burst=100)
+    budgets.charge("acme", 100)
+    with pytest.raises(AdmissionRejected) as rejected:
+        budgets.charge("acme", 25)
+    assert rejected.value.status_code == 429
+    assert rejected.value.reason == "token_budget"
+    assert rejected.value.retry_after == 3  # 25 tokens at 10 per second, rounded up
+    # Other tenants have their own bucket
+    budgets.charge("globex", 100)
+    # A refund makes the tokens available again
+    budgets.refund("acme", 25)
+    budgets.charge("acme", 25)
+    assert budgets.stats()["rejected"] == 1
+
+
+def test_full_queue_is_rejected_right_away(clock):
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, queue_timeout=10)
+
+    async def run():
+        slot = await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        with pytest.raises(AdmissionRejected) as rejected:
+            await limiter.acquire()
+        slot.release()
+        (await waiter).release()
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert (rejected.status_code, rejected.reason) == (503, "queue_full")
+    # One request waiting ahead, one slot, 1 s default hold time
+    assert rejected.retry_after == 2
+    assert limiter.stats()["admitted"] == 2
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_queue_timeout_is_rejected():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=5, queue_timeout=0.01)
+
+    async def run():
+        slot = await limiter.acquire()
+        try:
+            with pytest.raises(AdmissionRejected) as rejected:
+                await limiter.acquire()
+        finally:
+            slot.release()
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert (rejected.status_code, rejected.reason) == (503, "queue_timeout")
+    assert limiter.waiting == 0
+
+
+def test_retry_after_follows_the_slot_hold_time(clock):
+    limiter = ConcurrencyLimiter(max_concurrent=2, max_queue=10, queue_timeout=10)
+
+    async def run():
+        slot = await limiter.acquire()
+        clock.advance(11)
+        slot.release()
+
+    asyncio.run(run())
+    # Moving average 0.9 * 1 s + 0.1 * 11 s = 2 s per request, two slots
+    assert limiter.retry_after() == 1
+    limiter.waiting = 3
+    assert limiter.retry_after() == 4
+
+
+@pytest.fixture
+def held_answers(monkeypatch):
+    """Chat answers that wait for the returned event, so requests stay admitted"""
+    release = asyncio.Event()
+
+    async def fake_answer_chat(request, tenant, session=None):
+        await release.wait()
+        return "answer", None, 1
+
+    monkeypatch.setattr(main, "answer_chat", fake_answer_chat)
+    monkeypatch.setattr(main, "CHAT_COALESCING_ENABLED", False)
+    return release
+
+
+def chat(client: httpx.AsyncClient, message: str, tenant_id: str = "acme"):
+    return client.post("/chat", json={"message": message, "use_rag": False}, headers={"X-Tenant-ID": tenant_id})
+
+
+def run_client(scenario):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+    return asyncio.run(run())
+
+
+def test_exhausted_token_budget_answers_429_with_retry_after(held_answers, monkeypatch):
+    held_answers.set()
+    estimate = main.estimate_chat_tokens(main.ChatRequest(message="hello", use_rag=False))
+    # Room for exactly one request, refilled at one token per second
+    monkeypatch.setattr(main, "token_budgets", TokenBudgets(tokens_per_minute=60, burst=estimate))
+
+    async def scenario(client):
+        return await chat(client, "hello"), await chat(client, "hello"), await chat(client, "hello", "globex")
+
+    first, second, other_tenant = run_client(scenario)
+    assert first.status_code == 200
+    assert second.status_code == 429
+    assert 1 <= int(second.headers["Retry-After"]) <= estimate
+    assert "token_budget" in second.json()["detail"]
+    assert other_tenant.status_code == 200
+
+
+def test_full_queue_answers_503_with_retry_after(held_answers, monkeypatch):
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=1, queue_timeout=10)
+    monkeypatch.setattr(main, "token_budgets", None)
+    monkeypatch.setattr(main, "chat_limiter", limiter)
+
+    async def scenario(client):
+        requests = [asyncio.ensure_future(chat(client, f"question {i}")) for i in range(4)]
+        # One request runs, one waits, the other two are turned away
+        while limiter.rejected < 2:
+            await asyncio.sleep(0.001)
+        held_answers.set()
+        return await asyncio.gather(*requests)
+
+    responses = run_client(scenario)
+    assert sorted(response.status_code for response in responses) == [200, 200, 503, 503]
+    for response in responses:
+        if response.status_code == 503:
+            assert response.headers["Retry-After"] == "2"
+            assert "queue_full" in response.json()["detail"]
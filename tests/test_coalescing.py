@@ -0,0 +1,178 @@
+"""
+Request coalescing: identical concurrent requests share one upstream call and
+its outcome, errors included
+"""
+
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# Configure the service before it is imported: no real endpoints and no on-disk state
+os.environ.update({
+    "AZURE_OPENAI_ENDPOINT": "http://test.invalid",
+    "AZURE_OPENAI_API_KEY": "test",
+    "EMBEDDING_CACHE_PATH": ":memory:",
+    "VECTORSTORE_DIR": "",
+})
+for name in ("DT_ENDPOINT", "DT_API_TOKEN"):
+    os.environ.pop(name, None)
+sys.path.insert(0, str(APP_DIR))
+
+import main  # noqa: E402
+from coalescing import SingleFlight, coalescing_key  # noqa: E402
+
+
+def test_key_ignores_case_and_whitespace():
+    assert coalescing_key("  What is  RAG?\n", True) == coalescing_key("what is rag?", True)
+    assert coalescing_key("what is rag?", True) != coalescing_key("what is rag?", False)
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flights.do(("q",), work) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [result for result, _, _ in results] == ["answer"] * 5
+    assert [is_leader for _, is_leader, _ in results] == [True, False, False, False, False]
+    assert {followers for _, _, followers in results} == {4}
+    assert flights.stats() == {"inflight": 0, "leaders": 1, "followers": 4}
+
+
+def test_different_keys_and_later_calls_run_again():
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return len(calls)
+
+    async def run():
+        await asyncio.gather(flights.do(("a",), work), flights.do(("b",), work))
+        return await flights.do(("a",), work)
+
+    assert asyncio.run(run()) == (3, True, 0)
+    assert len(calls) == 3
+
+
+def test_leader_error_reaches_followers():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        return await asyncio.gather(*(flights.do(("q",), work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) and str(result) == "upstream failed" for result in results)
+    assert flights.stats()["inflight"] == 0
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flights.do(("q",), work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do(("q",), work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("answer", False, 1)
+
+
+def test_stream_followers_replay_and_share_errors():
+    flights = SingleFlight()
+    started = []
+
+    async def events():
+        started.append(1)
+        yield "a"
+        await asyncio.sleep(0.01)
+        yield "b"
+        raise RuntimeError("stream failed")
+
+    async def consume(iterator):
+        received = []
+        try:
+            async for event in iterator:
+                received.append(event)
+        except RuntimeError as e:
+            received.append(str(e))
+        return received
+
+    async def run():
+        leader, is_leader, _ = flights.stream(("q",), events)
+        first = asyncio.ensure_future(consume(leader))
+        await asyncio.sleep(0.005)
+        # Joins after "a" was sent and replays it
+        follower, follower_is_leader, flight = flights.stream(("q",), events)
+        assert is_leader and not follower_is_leader
+        return await asyncio.gather(first, consume(follower)), flight.followers
+
+    (leader_events, follower_events), followers = asyncio.run(run())
+    assert len(started) == 1
+    assert leader_events == follower_events == ["a", "b", "stream failed"]
+    assert followers == 1
+
+
+@pytest.fixture
+def counted_answers(monkeypatch):
+    calls = []
+
+    async def fake_answer_chat(request, tenant, session=None):
+        calls.append(request.message)
+        await asyncio.sleep(0.05)
+        if request.message.startswith("fail"):
+            raise RuntimeError("upstream failed")
+        return f"answer to {request.message}", None, 1
+
+    monkeypatch.setattr(main, "answer_chat", fake_answer_chat)
+    monkeypatch.setattr(main, "CHAT_COALESCING_ENABLED", True)
+    return calls
+
+
+def post_concurrently(messages):
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/chat", json={"message": message, "use_rag": False}) for message in messages
+            ))
+    return asyncio.run(run())
+
+
+def test_identical_chat_requests_share_one_upstream_call(counted_answers):
+    responses = post_concurrently(["What is RAG?", "what is  rag?", "What is RAG?", "Something else"])
+    assert [response.status_code for response in responses] == [200] * 4
+    assert sorted(counted_answers) == ["Something else", "What is RAG?"]
+    assert len({response.json()["response"] for response in responses[:3]}) == 1
+
+
+def test_leader_failure_reaches_every_coalesced_chat_request(counted_answers):
+    responses = post_concurrently(["fail please"] * 3)
+    assert counted_answers == ["fail please"]
+    assert [response.status_code for response in responses] == [500] * 3
+    assert all("upstream failed" in response.json()["detail"] for response in responses)
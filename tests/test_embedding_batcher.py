@@ -0,0 +1,53 @@
+"""
+EmbeddingBatcher: concurrent queries share one embedding call, and callers
+never hang when that call fails or is cancelled
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from embedding_batcher import EmbeddingBatcher  # noqa: E402
+
+
+class FakeEmbeddings:
+    def __init__(self, hang: bool = False):
+        self.hang = hang
+        self.calls = []
+
+    async def aembed_documents(self, texts):
+        self.calls.append(list(texts))
+        if self.hang:
+            await asyncio.Event().wait()
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_queries_share_one_call():
+    embeddings = FakeEmbeddings()
+    batcher = EmbeddingBatcher(embeddings, max_batch_size=3, max_wait_ms=1000)
+
+    async def run():
+        return await asyncio.gather(batcher.embed_query("a"), batcher.embed_query("bb"), batcher.embed_query("a"))
+
+    assert asyncio.run(run()) == [[1.0], [2.0], [1.0]]
+    assert embeddings.calls == [["a", "bb"]]
+
+
+def test_cancelled_flush_fails_the_waiting_callers():
+    embeddings = FakeEmbeddings(hang=True)
+    batcher = EmbeddingBatcher(embeddings, max_batch_size=2, max_wait_ms=1000)
+
+    async def run():
+        callers = [asyncio.ensure_future(batcher.embed_query(text)) for text in ("a", "b")]
+        while not embeddings.calls:
+            await asyncio.sleep(0)
+        for flush_task in list(batcher._inflight):
+            flush_task.cancel()
+        return await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), 1)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
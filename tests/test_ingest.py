@@ -0,0 +1,71 @@
+"""
+Streaming /documents/batch parser: truncated bodies wait for more data,
+malformed ones fail as soon as the bad document is seen
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from ingest import iter_json_objects  # noqa: E402
+
+DOCUMENT = {"content": "café 😀 \"quoted\" {braces} \\", "metadata": {"n": [1, -2.5e3, True, None]}}
+
+
+def parse(chunks, **kwargs):
+    """Parse chunks as a streamed body; returns (objects, error, chunks read)"""
+    read = []
+
+    async def body():
+        for chunk in chunks:
+            read.append(chunk)
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+    async def run():
+        objects = []
+        try:
+            async for item in iter_json_objects(body(), **kwargs):
+                objects.append(item)
+        except ValueError as e:
+            return objects, e, len(read)
+        return objects, None, len(read)
+
+    return asyncio.run(run())
+
+
+def test_document_split_at_any_point_is_parsed():
+    raw = json.dumps(DOCUMENT).encode("utf-8")
+    for cut in range(len(raw) + 1):
+        objects, error, _ = parse([raw[:cut], raw[cut:]])
+        assert error is None, cut
+        assert objects == [DOCUMENT]
+
+
+def test_truncated_body_is_reported_as_incomplete():
+    objects, error, _ = parse(['{"content": "a"}\n', '{"content": "b", "metadata": {"n": 1.'])
+    assert objects == [{"content": "a"}]
+    assert "incomplete document" in str(error)
+
+
+@pytest.mark.parametrize("chunks", [
+    ['{"content": "a"} garbage {"content": "b"}', '{"content": "c"}'],
+    ['{"content": "a"}', ' garbage', ' {"content": "b"}', '{"content": "c"}'],
+    ['[{"content": "a"}, {"content": x}]', '{"content": "c"}'],
+])
+def test_malformed_document_fails_before_the_rest_of_the_body(chunks):
+    objects, error, read = parse(chunks)
+    assert objects == [{"content": "a"}]
+    assert str(error).startswith("Malformed document")
+    assert read < len(chunks)
+
+
+def test_pending_document_is_capped():
+    objects, error, read = parse(['{"content": "' + "a" * 100, "a" * 100, "a" * 100 + '"}'], max_document_chars=150)
+    assert objects == []
+    assert "longer than 150" in str(error)
+    assert read == 2
@@ -0,0 +1,71 @@
+"""
+Intent classification and retrieval overlap unless INTENT_SCHEDULING=sequential
+
+Both stages are replaced by 200 ms fakes, so analyze_and_retrieve takes about
+200 ms when they overlap (concurrent) or intent is off the critical path
+(background), and about 400 ms when they run one after the other.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# Configure the service before it is imported: no real endpoints and no on-disk state
+os.environ.update({
+    "AZURE_OPENAI_ENDPOINT": "http://test.invalid",
+    "AZURE_OPENAI_API_KEY": "test",
+    "EMBEDDING_CACHE_PATH": ":memory:",
+    "VECTORSTORE_DIR": "",
+    "INTENT_BACKEND": "llm",
+})
+for name in ("DT_ENDPOINT", "DT_API_TOKEN"):
+    os.environ.pop(name, None)
+sys.path.insert(0, str(APP_DIR))
+
+import main  # noqa: E402
+
+STAGE_SECONDS = 0.2
+
+
+@pytest.fixture
+def slow_stages(monkeypatch):
+    async def fake_intent(query, query_embedding=None):
+        await asyncio.sleep(STAGE_SECONDS)
+        return {"intent": "general", "query": query}
+
+    async def fake_retrieval(query, query_embedding=None, tenant=None):
+        await asyncio.sleep(STAGE_SECONDS)
+        return ["doc"]
+
+    monkeypatch.setattr(main, "analyze_query_intent", fake_intent)
+    monkeypatch.setattr(main, "retrieve_documents", fake_retrieval)
+
+
+def timed_analyze_and_retrieve() -> tuple:
+    async def run():
+        started = time.perf_counter()
+        result = await main.analyze_and_retrieve("What is distributed tracing?")
+        return result, time.perf_counter() - started
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("mode", ["concurrent", "background"])
+def test_stages_overlap(monkeypatch, slow_stages, mode):
+    monkeypatch.setattr(main, "INTENT_SCHEDULING", mode)
+    (docs, _), elapsed = timed_analyze_and_retrieve()
+    assert docs == ["doc"]
+    assert STAGE_SECONDS * 0.9 <= elapsed < STAGE_SECONDS * 1.5
+
+
+def test_sequential_runs_stages_one_after_the_other(monkeypatch, slow_stages):
+    monkeypatch.setattr(main, "INTENT_SCHEDULING", "sequential")
+    (docs, intent), elapsed = timed_analyze_and_retrieve()
+    assert docs == ["doc"]
+    assert intent == "general"
+    assert elapsed >= STAGE_SECONDS * 2 * 0.95
@@ -0,0 +1,242 @@
+"""
+ResilientCaller: half-open circuit breaker trial, retry budget, hedging and
+which breaker a missed deadline is charged to
+
+Breaker and retry budget timing runs on a fake clock; failures come from
+injected callables.
+"""
+
+import asyncio
+import sys
+import types
+from pathlib import Path
+
+import httpx
+import openai
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import admission  # noqa: E402
+import resilience  # noqa: E402
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, LatencyWindow, ResilientCaller  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    # Replace the modules' time, not time.monotonic itself, which the event loop uses
+    fake_time = types.SimpleNamespace(monotonic=fake.monotonic, sleep=lambda seconds: None)
+    monkeypatch.setattr(resilience, "time", fake_time)
+    monkeypatch.setattr(admission, "time", fake_time)
+    return fake
+
+
+async def hang(deployment):
+    await asyncio.Event().wait()
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_half_open_breaker_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    assert breaker.acquire() is None
+
+    clock.advance(30)
+    assert breaker.state == "half_open"
+    assert breaker.acquire() is True
+    # Everything else waits for the trial's result
+    assert not breaker.allow()
+    assert breaker.acquire() is None
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.acquire() is False
+    assert breaker.acquire() is False
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock.advance(30)
+    assert breaker.acquire() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.acquire() is None
+    clock.advance(30)
+    assert breaker.acquire() is True
+
+
+def test_concurrent_calls_on_a_half_open_breaker(clock):
+    caller = ResilientCaller(max_retries=0, failure_threshold=1, reset_timeout=30)
+    open_breaker(caller.breaker("a"))
+    clock.advance(30)
+    release = asyncio.Event()
+
+    async def slow(deployment):
+        await release.wait()
+        return deployment
+
+    async def run():
+        trial = asyncio.ensure_future(caller.call("chat", ["a"], slow, deadline=5))
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await caller.call("chat", ["a"], slow, deadline=5)
+        release.set()
+        return await trial
+
+    assert asyncio.run(run()) == "a"
+    assert caller.breaker("a").state == "closed"
+
+
+def test_cancelled_trial_is_released(clock):
+    caller = ResilientCaller(max_retries=0, failure_threshold=1, reset_timeout=30)
+    breaker = caller.breaker("a")
+    open_breaker(breaker)
+    clock.advance(30)
+
+    started = asyncio.Event()
+
+    async def hanging(deployment):
+        started.set()
+        await asyncio.Event().wait()
+
+    async def run():
+        trial = asyncio.ensure_future(caller.call("chat", ["a"], hanging, deadline=5))
+        await started.wait()
+        assert breaker.trial
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(run())
+    assert breaker.state == "half_open"
+    assert breaker.acquire() is True
+
+
+def test_retries_stop_when_the_budget_is_spent(clock):
+    caller = ResilientCaller(max_retries=100, retry_min_per_second=1.0, base_backoff=0, failure_threshold=1000)
+    attempts = []
+
+    async def failing(deployment):
+        attempts.append(deployment)
+        raise openai.APIConnectionError(request=httpx.Request("POST", "http://test.invalid"))
+
+    # The bucket starts with 10 tokens and every call deposits 0.1; the clock is frozen, so no refill
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(caller.call("chat", ["a"], failing, deadline=5))
+    assert len(attempts) == 11
+    assert caller.counts["retry"] == 10
+    assert caller.counts["retry_budget_exhausted"] == 1
+
+    # Refilled at retry_min_per_second
+    attempts.clear()
+    clock.advance(2)
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(caller.call("chat", ["a"], failing, deadline=5))
+    assert len(attempts) == 3
+
+
+def test_bad_requests_are_not_retried(clock):
+    caller = ResilientCaller(max_retries=3, base_backoff=0)
+    attempts = []
+
+    async def bad_request(deployment):
+        attempts.append(deployment)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(caller.call("chat", ["a"], bad_request, deadline=5))
+    assert attempts == ["a"]
+    assert caller.breaker("a").failures == 0
+
+
+def warm_up(caller: ResilientCaller, stage: str, deployment: str, seconds: float):
+    window = caller.latencies.setdefault((stage, deployment), LatencyWindow())
+    for _ in range(window.min_samples):
+        window.add(seconds)
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    caller = ResilientCaller(hedge_min_delay=0.01)
+    warm_up(caller, "chat", "a", 0.01)
+
+    async def attempt(deployment):
+        if deployment == "a":
+            await asyncio.Event().wait()
+        return deployment
+
+    assert asyncio.run(caller.call("chat", ["a", "b"], attempt, deadline=5, hedge_to="b")) == "b"
+    assert caller.counts["hedge"] == 1
+    assert caller.counts["hedge_won"] == 1
+
+
+def test_fast_call_is_not_hedged():
+    caller = ResilientCaller(hedge_min_delay=1.0)
+    warm_up(caller, "chat", "a", 0.01)
+    called = []
+
+    async def attempt(deployment):
+        called.append(deployment)
+        return deployment
+
+    assert asyncio.run(caller.call("chat", ["a", "b"], attempt, deadline=5, hedge_to="b")) == "a"
+    assert called == ["a"]
+    assert "hedge" not in caller.counts
+
+
+def test_no_hedge_without_latency_history():
+    caller = ResilientCaller(hedge_min_delay=0.01)
+    called = []
+
+    async def attempt(deployment):
+        called.append(deployment)
+        await asyncio.sleep(0.05)
+        return deployment
+
+    assert asyncio.run(caller.call("chat", ["a", "b"], attempt, deadline=5, hedge_to="b")) == "a"
+    assert called == ["a"]
+
+
+def test_missed_deadline_is_charged_to_the_deployment_in_flight():
+    caller = ResilientCaller(max_retries=0)
+    open_breaker(caller.breaker("a"))
+    failures = caller.breaker("a").failures
+
+    # "a" is skipped, so only the fallback "b" was running when the deadline hit
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(caller.call("chat", ["a", "b"], hang, deadline=0.05))
+    assert caller.breaker("a").failures == failures
+    assert caller.breaker("b").failures == 1
+
+
+def test_missed_deadline_during_backoff_is_not_charged_twice(monkeypatch):
+    # Full jitter always picks the longest backoff, well past the deadline
+    monkeypatch.setattr(resilience, "random", types.SimpleNamespace(uniform=lambda low, high: high))
+    caller = ResilientCaller(max_retries=1, base_backoff=10, max_backoff=10)
+    attempts = []
+
+    async def failing(deployment):
+        attempts.append(deployment)
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(caller.call("chat", ["a"], failing, deadline=0.05))
+    assert attempts == ["a"]
+    assert caller.breaker("a").failures == 1